@@ -0,0 +1,63 @@
+"""
+Benchmark Resource.__call__ against the implementation that built a closure
+and re-joined the Allow header on every request.
+
+Usage: python benchmarks/dispatch.py
+"""
+
+import timeit
+
+from restish import http, resource
+
+
+def old_call(self, request):
+    """
+    The previous version of Resource.__call__.
+    """
+    dispatchers = self.request_dispatchers.get(request.method)
+    if dispatchers is None:
+        return http.method_not_allowed(', '.join(self.request_dispatchers))
+    dispatcher, reason, content_type = \
+            resource._negotiate(self.__class__, dispatchers, request)
+    if dispatcher is not None:
+        (callable, match) = dispatcher
+        response = (lambda r: callable(self, r))(request)
+        return resource._complete_response(response, content_type)
+    return resource._best_dispatcher_error_response(reason)
+
+
+class Resource(resource.Resource):
+
+    @resource.GET()
+    def get(self, request):
+        return None
+
+    @resource.POST(accept='json')
+    def post(self, request):
+        return None
+
+
+def main(number=20000):
+    res = Resource()
+    cases = [
+        ('GET', http.Request.blank('/')),
+        ('GET Accept', http.Request.blank('/', headers={'Accept': 'text/html'})),
+        ('POST Accept', http.Request.blank('/', headers={
+            'Accept': 'application/json'})),
+        ('PUT (405)', http.Request.blank('/')),
+        ]
+    cases[1][1].method = 'GET'
+    cases[2][1].method = 'POST'
+    cases[3][1].method = 'PUT'
+    print '%12s %12s %12s %8s' % ('request', 'old', 'new', 'speedup')
+    for name, request in cases:
+        times = []
+        for func in [old_call, resource.Resource.__call__.im_func]:
+            timer = timeit.Timer(lambda: func(res, request))
+            times.append(min(timer.repeat(3, number)) / number * 1e6)
+        print '%12s %10.2fus %10.2fus %7.1fx' % (name, times[0], times[1],
+                                                  times[0] / times[1])
+
+
+if __name__ == '__main__':
+    main()
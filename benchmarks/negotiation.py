@@ -0,0 +1,92 @@
+"""
+Benchmark restish's content negotiation against the mimeparse-based
+implementation it replaced.
+
+Negotiation is timed without the negotiation cache, i.e. as if every request
+had a previously unseen Accept header.
+
+Usage: python benchmarks/negotiation.py
+"""
+
+import sys
+import timeit
+
+try:
+    import mimeparse
+except ImportError:
+    sys.exit('The mimeparse package is needed to run this benchmark.')
+
+from restish import http, resource
+
+
+ACCEPT = 'text/html;q=0.5, application/x-type%d, */*;q=0.1'
+
+
+def mimeparse_best_dispatcher(dispatchers, request):
+    """
+    The mimeparse version of resource._best_dispatcher.
+    """
+    def filter_dispatchers(dispatchers, match, value):
+        supported = []
+        for d in dispatchers:
+            supported.extend(d[1][match])
+        supported.reverse()
+        best_match = mimeparse.best_match(supported, value)
+        return [d for d in dispatchers if best_match in d[1][match]]
+    content_type = request.headers.get('content-type')
+    if content_type:
+        dispatchers = filter_dispatchers(dispatchers, 'content_type',
+                                         str(content_type))
+    if not dispatchers:
+        return None, 415
+    accept = str(request.accept)
+    if accept:
+        dispatchers = filter_dispatchers(dispatchers, 'accept', accept)
+    if not dispatchers:
+        return None, 406
+    dispatcher = dispatchers[0]
+    best_match = mimeparse.best_match(dispatcher[1]['accept'][::-1], accept)
+    return dispatcher, best_match
+
+
+def restish_best_dispatcher(dispatchers, request):
+    dispatcher, reason = resource._best_dispatcher(dispatchers, request)
+    return dispatcher, resource._response_content_type(dispatcher[1], request)
+
+
+def make_dispatchers(count):
+    """
+    Create a resource class with count GET handlers, each accepting a
+    different media type, and return its GET dispatchers.
+    """
+    def handler(request):
+        pass
+    attrs = {}
+    for i in range(count):
+        attrs['handler%d' % i] = \
+                resource.GET(accept='application/x-type%d' % i)(handler)
+    Resource = type('Resource', (resource.Resource,), attrs)
+    return Resource.request_dispatchers['GET']
+
+
+def main(number=2000):
+    print '%12s %12s %12s %8s' % ('dispatchers', 'mimeparse', 'restish',
+                                   'speedup')
+    for count in [1, 10, 50]:
+        dispatchers = make_dispatchers(count)
+        request = http.Request.blank('/', headers={
+            'Accept': ACCEPT % (count - 1)})
+        request.environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        # Both implementations must agree.
+        expected = mimeparse_best_dispatcher(dispatchers, request)
+        assert restish_best_dispatcher(dispatchers, request) == expected
+        times = []
+        for func in [mimeparse_best_dispatcher, restish_best_dispatcher]:
+            timer = timeit.Timer(lambda: func(dispatchers, request))
+            times.append(min(timer.repeat(3, number)) / number * 1e6)
+        print '%12d %10.1fus %10.1fus %7.1fx' % (count, times[0], times[1],
+                                                  times[0] / times[1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark url.split_query against the generator-based implementation it
+replaced and urlparse.parse_qsl, using faceted search style query strings.
+
+parse_qsl returns byte strings; it is also timed with its names and values
+decoded to unicode, which is what split_query returns.
+
+Usage: python benchmarks/query.py
+"""
+
+import timeit
+import urllib
+import urlparse
+
+from restish import url
+
+
+def old_split_query(query):
+    """
+    The previous version of url.split_query.
+    """
+    def split(query):
+        for x in query.split('&'):
+            if '=' in x:
+                yield tuple(urllib.unquote_plus(s).decode('utf-8')
+                            for s in x.split('=', 1))
+            elif x:
+                yield (urllib.unquote_plus(x).decode('utf-8'), None)
+    return list(split(query))
+
+
+def parse_qsl(query):
+    return urlparse.parse_qsl(query, keep_blank_values=True)
+
+
+def parse_qsl_decoded(query):
+    return [(k.decode('utf-8'), v.decode('utf-8'))
+            for k, v in urlparse.parse_qsl(query, keep_blank_values=True)]
+
+
+def make_query(count, escaped):
+    """
+    Make a query string of count params, one in escaped of which need
+    unquoting.
+    """
+    params = []
+    for i in range(count):
+        if escaped and i % escaped == 0:
+            params.append(('facet', 'colour:dark red/%d' % i))
+        else:
+            params.append(('f_attr%d' % i, 'value%d' % i))
+    return urllib.urlencode(params)
+
+
+def main(number=2000):
+    funcs = [old_split_query, url.split_query, parse_qsl, parse_qsl_decoded]
+    print '%22s %12s %12s %12s %12s' % ('params', 'old', 'split_query',
+                                        'parse_qsl', '(decoded)')
+    for count, escaped in [(10, 0), (60, 0), (60, 5), (200, 5)]:
+        query = make_query(count, escaped)
+        assert url.split_query(query) == old_split_query(query) == \
+                parse_qsl_decoded(query)
+        times = []
+        for func in funcs:
+            timer = timeit.Timer(lambda: func(query))
+            times.append(min(timer.repeat(3, number)) / number * 1e6)
+        name = '%d (%s escaped)' % (count, escaped and '1/%d' % escaped
+                                    or 'none')
+        print '%22s %10.1fus %10.1fus %10.1fus %10.1fus' % ((name,) +
+                                                            tuple(times))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+Benchmark locating a resource at the end of a chain of cacheable children
+with and without the application's traversal cache.
+
+Usage: python benchmarks/traversal.py
+"""
+
+import timeit
+
+from restish import app, http, resource
+
+
+class Node(resource.Resource):
+
+    @resource.child('{name}', cacheable=True)
+    def child(self, request, segments, name):
+        return Node()
+
+
+def main(number=5000):
+    print '%8s %12s %12s %8s' % ('depth', 'uncached', 'cached', 'speedup')
+    for depth in [1, 4, 8]:
+        path = '/' + '/'.join('node%d' % i for i in range(depth))
+        request = http.Request.blank(path)
+        times = []
+        for size in [0, 1024]:
+            application = app.RestishApp(Node(), traversal_cache_size=size)
+            timer = timeit.Timer(
+                lambda: application.locate_resource(request))
+            times.append(min(timer.repeat(3, number)) / number * 1e6)
+        print '%8d %10.1fus %10.1fus %7.1fx' % (depth, times[0], times[1],
+                                                 times[0] / times[1])
+
+
+if __name__ == '__main__':
+    main()
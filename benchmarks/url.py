@@ -0,0 +1,48 @@
+"""
+Benchmark chained URL manipulations against the same changes made with a
+URLBuilder.
+
+Usage: python benchmarks/url.py
+"""
+
+import timeit
+
+from restish import url
+
+
+BASE = url.URL('http://localhost:8080/collection/items?sort=name&page=1')
+IDS = [str(i) for i in range(100)]
+
+
+def chained():
+    return BASE.child('a').child('b').q('page', 2).anchor('x')
+
+
+def built():
+    return BASE.builder().child('a').child('b').q('page', 2).anchor('x').url()
+
+
+def children_chained():
+    return [BASE.child(id) for id in IDS]
+
+
+def children_built():
+    return BASE.builder().children(IDS)
+
+
+def main(number=1000):
+    assert chained() == built()
+    assert children_chained() == children_built()
+    print '%24s %12s %12s %8s' % ('', 'URL', 'URLBuilder', 'speedup')
+    for name, funcs in [('child/child/q/anchor', (chained, built)),
+                        ('100 children', (children_chained, children_built))]:
+        times = []
+        for func in funcs:
+            timer = timeit.Timer(func)
+            times.append(min(timer.repeat(3, number)) / number * 1e6)
+        print '%24s %10.1fus %10.1fus %7.1fx' % (name, times[0], times[1],
+                                                  times[0] / times[1])
+
+
+if __name__ == '__main__':
+    main()
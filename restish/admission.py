@@ -0,0 +1,120 @@
+"""
+Load shedding: rejecting requests early, with a 503 Service Unavailable
+response, when the application is overloaded rather than letting them queue
+until they time out.
+
+An AdmissionController, given to RestishApp, tracks the number of requests
+being handled (in flight) and how long each request waited before reaching the
+application (its queue latency). Once either passes its threshold, new
+requests are rejected:
+
+    admission = admission.AdmissionController(max_in_flight=50,
+                                              max_queue_latency=2.0,
+                                              exempt_paths=['/health'])
+    application = app.RestishApp(root, admission=admission)
+
+Requests are admitted before their resource is located, so a rejected request
+costs almost nothing, and are in flight from then until their response is
+returned.
+
+Queue latency is measured from the X-Request-Start header set by a front-end
+proxy, e.g. nginx's ``proxy_set_header X-Request-Start "t=${msec}";``, in
+seconds, milliseconds or microseconds since the epoch.
+
+Requests for a path under one of the exempt_paths, e.g. health probes, are
+never rejected. Nor are requests in an exempt priority class (see
+restish.scheduler), but the priority class is only known once the resource
+has been located so, while overloaded, every request is located before it is
+rejected. Prefer exempt_paths.
+"""
+
+import threading
+import time
+
+from restish import http
+
+
+class AdmissionController(object):
+    """
+    Rejects requests while more than max_in_flight requests are being handled
+    or a request's queue latency is more than max_queue_latency seconds. Either
+    threshold can be None (the default) to disable it.
+
+    Rejected requests get a 503 response with a Retry-After header of
+    retry_after seconds.
+    """
+
+    def __init__(self, max_in_flight=None, max_queue_latency=None,
+                 retry_after=1, exempt=(), exempt_paths=(), timer=time.time):
+        self.max_in_flight = max_in_flight
+        self.max_queue_latency = max_queue_latency
+        self.exempt = frozenset(exempt)
+        self.exempt_paths = tuple(path.rstrip('/') for path in exempt_paths)
+        self.in_flight = 0
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._rejected = http.CannedResponse(
+            '503 Service Unavailable',
+            [('Content-Type', 'text/plain'),
+             ('Retry-After', str(retry_after))],
+            '503 Service Unavailable')
+
+    def enter(self, request, priority_class=None):
+        """
+        Admit the request, counting it as in flight, or return a 503 response
+        if it is rejected.
+
+        An admitted request must be counted out again by calling leave().
+        """
+        exempt = priority_class in self.exempt or self._exempt_path(request)
+        with self._lock:
+            if not exempt and self.max_in_flight is not None and \
+                    self.in_flight >= self.max_in_flight:
+                return self._rejected()
+            self.in_flight += 1
+        if not exempt and self.max_queue_latency is not None:
+            latency = self.queue_latency(request)
+            if latency is not None and latency > self.max_queue_latency:
+                self.leave()
+                return self._rejected()
+        return None
+
+    def _exempt_path(self, request):
+        """
+        Return whether the request's path is, or is under, an exempt path.
+        """
+        if not self.exempt_paths:
+            return False
+        path = request.path_info
+        for prefix in self.exempt_paths:
+            if path == prefix or path.startswith(prefix + '/'):
+                return True
+        return False
+
+    def leave(self):
+        """
+        Count an admitted request as finished.
+        """
+        with self._lock:
+            self.in_flight -= 1
+
+    def queue_latency(self, request):
+        """
+        Return how long, in seconds, the request waited before reaching the
+        application, or None if that is not known.
+        """
+        start = request.environ.get('HTTP_X_REQUEST_START')
+        if not start:
+            return None
+        if start.startswith('t='):
+            start = start[2:]
+        try:
+            start = float(start)
+        except ValueError:
+            return None
+        # Convert microseconds or milliseconds to seconds.
+        if start > 1e14:
+            start /= 1e6
+        elif start > 1e11:
+            start /= 1e3
+        return max(self._timer() - start, 0)
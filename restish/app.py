@@ -1,53 +1,161 @@
 """
 Core wsgi application
 """
-from restish import error, http, url
+import time
+
+from restish import cache, error, http
+from restish.resource import CacheableChild, Resource, priority_class
 
 
 class RestishApp(object):
+    """
+    WSGI application that serves the resource hierarchy starting at
+    root_resource.
+
+    Child resources declared with @resource.child(..., cacheable=True) are
+    remembered for the path they were found at, in a cache of at most
+    traversal_cache_size paths, so a later request for the same path (or a
+    path below it) can skip the traversal to them. Only chains of cacheable
+    children, starting at the root resource, are cached.
+
+    If an admission controller (a restish.admission.AdmissionController) is
+    given, it can reject requests with a 503 response before the resource is
+    located. If a scheduler (a restish.scheduler.Scheduler) is given, the
+    resource is only called once the scheduler allows a request of the
+    resource's priority class to start.
+
+    Requests can be given a deadline, see http.Request.deadline, timeout
+    seconds after they arrive and/or after the number of seconds in the
+    timeout_header request header, e.g. 'X-Request-Timeout'. A request whose
+    deadline passes before a resource is found or called, including while it
+    waits for the scheduler, gets a 504 Gateway Timeout response.
+    """
 
-    def __init__(self, root_resource):
+    def __init__(self, root_resource, traversal_cache_size=1024,
+                 scheduler=None, admission=None, timeout=None,
+                 timeout_header=None):
         self.root = root_resource
+        self.traversal_cache = cache.LRUCache(traversal_cache_size)
+        self.scheduler = scheduler
+        self.admission = admission
+        self.timeout = timeout
+        self.timeout_header = timeout_header
+        # Only skip raising http.NotFoundError for a missing resource if
+        # locate_resource is not overridden.
+        self._locate_overridden = type(self).locate_resource.im_func is not \
+                RestishApp.locate_resource.im_func
+        if timeout_header is not None:
+            self._timeout_key = \
+                    'HTTP_' + timeout_header.upper().replace('-', '_')
+        else:
+            self._timeout_key = None
 
     def __call__(self, environ, start_response):
         # Create a request object.
         request = http.Request(environ)
+        if self.timeout is not None or self._timeout_key is not None:
+            self._set_deadline(request)
         try:
             # Locate the resource and convert it to a response.
-            resource_or_response = self.locate_resource(request)
-            response = self.get_response(request, resource_or_response)
+            if self.admission is None:
+                response = self._response(request, self._locate(request))
+            else:
+                response = self._admitted_response(request)
         except error.HTTPError as e:
             response = e.make_response()
         # Send the response to the WSGI parent.
-        start_response(response.status, response.headerlist)
-        return response.app_iter
+        status, headers, app_iter = response.wsgi_response()
+        start_response(status, headers)
+        return app_iter
+
+    def _set_deadline(self, request):
+        """
+        Set the request's deadline from the configured timeout and the timeout
+        header, keeping any earlier deadline it already has.
+        """
+        timeout = self.timeout
+        if self._timeout_key is not None:
+            try:
+                requested = float(request.environ[self._timeout_key])
+            except (KeyError, ValueError):
+                pass
+            else:
+                if requested >= 0 and (timeout is None or requested < timeout):
+                    timeout = requested
+        if timeout is None:
+            return
+        deadline = time.time() + timeout
+        if request.deadline is None or deadline < request.deadline:
+            request.deadline = deadline
+
+    def _locate(self, request):
+        """
+        Locate the resource, see locate_resource, returning a 404 response
+        rather than raising http.NotFoundError unless locate_resource is
+        overridden.
+        """
+        if self._locate_overridden:
+            return self.locate_resource(request)
+        resource_or_response = self._locate_resource(request)
+        if resource_or_response is None:
+            return http.not_found()
+        return resource_or_response
 
     def locate_resource(self, request):
         """
         Locate the resource at the path in request URL by traversing the
         resource hierarchy.
+
+        Raises http.NotFoundError if there is no resource at the path. Returns
+        a 504 response if the request's deadline passes.
+        """
+        resource = self._locate_resource(request)
+        if resource is None:
+            raise http.NotFoundError()
+        return resource
+
+    def _locate_resource(self, request):
+        """
+        Locate the resource, see locate_resource, returning None rather than
+        raising http.NotFoundError if there is no resource at the path.
         """
         # Calculate the path segments relative to the application,
         # special-casing requests for the the root segment (because we already
         # have a reference to the root resource).
+        path = request.environ['PATH_INFO']
         try:
-            segments = url.split_path(request.environ['PATH_INFO'])
+            segments = request.path_info_segments
         except UnicodeDecodeError:
             return http.bad_request()
         if segments == ['']:
             segments = []
+        # Skip the traversal to the deepest resource cached for the path.
+        resource, depth = self.root, 0
+        cacheable = path.startswith('/')
+        if segments and cacheable and len(self.traversal_cache):
+            resource, depth = self._cached_resource(path)
+            segments = segments[depth:]
         # Recurse into the resource hierarchy until we run out of segments or
         # find a Response.
-        resource = self.root
+        deadline = request.deadline
         while segments and not isinstance(resource, http.Response):
+            if deadline is not None and time.time() >= deadline:
+                return http.gateway_timeout()
             resource_child = getattr(resource, 'resource_child', None)
             # No resource_child method? 404.
             if resource_child is None:
-                raise http.NotFoundError()
+                return None
             result = resource_child(request, segments)
             # No result returned? 404.
             if result is None:
-                raise http.NotFoundError()
+                return None
+            # Cache the child if it, and every resource before it, is
+            # cacheable.
+            cacheable = cacheable and isinstance(result, CacheableChild) and \
+                    isinstance(resource, Resource)
+            if cacheable:
+                depth = self._cache_resource(path, segments, depth, result)
+                cacheable = depth is not None
             # Either a (resource, remaining segments) tuple or an object to
             # forward the lookup to is acceptable.
             if isinstance(result, tuple):
@@ -56,6 +164,88 @@ class RestishApp(object):
                 resource = result
         return resource
 
+    def _cached_resource(self, path):
+        """
+        Return the (resource, depth) of the deepest resource cached for a
+        prefix of path, or the root resource if there is none.
+        """
+        prefix = path
+        while prefix:
+            cached = self.traversal_cache.get(prefix)
+            if cached is not None:
+                return cached
+            prefix = prefix[:prefix.rfind('/')]
+        return self.root, 0
+
+    def _cache_resource(self, path, segments, depth, result):
+        """
+        Cache the (resource, remaining segments) result of a cacheable child
+        lookup for the path's segments, depth segments in.
+
+        Returns the depth of the child, or None if the child cannot be cached
+        because it is a response or the lookup did not simply consume leading
+        segments.
+        """
+        resource, remaining = result
+        consumed = len(segments) - len(remaining)
+        if isinstance(resource, http.Response) or consumed < 0 or \
+                list(remaining) != segments[consumed:]:
+            return None
+        depth += consumed
+        if depth:
+            prefix = '/'.join(path.split('/', depth + 1)[:depth + 1])
+            self.traversal_cache.set(prefix, (resource, depth))
+        return depth
+
+    def _admitted_response(self, request):
+        """
+        Locate the resource and get its response if the admission controller
+        admits the request.
+
+        The request is admitted before the resource is located, so that
+        rejecting it is cheap. If it is rejected, the resource is only located
+        to check whether its priority class is exempt.
+        """
+        admission = self.admission
+        rejected = admission.enter(request)
+        if rejected is None:
+            try:
+                return self._response(request, self._locate(request))
+            finally:
+                admission.leave()
+        if not admission.exempt:
+            return rejected
+        resource_or_response = self._locate(request)
+        if isinstance(resource_or_response, http.Response):
+            return resource_or_response
+        name = priority_class(resource_or_response, request.method)
+        if name not in admission.exempt:
+            return rejected
+        admission.enter(request, name)
+        try:
+            return self._response(request, resource_or_response)
+        finally:
+            admission.leave()
+
+    def _response(self, request, resource_or_response):
+        """
+        Get the response, see get_response, once the scheduler allows it.
+        """
+        scheduler = self.scheduler
+        if scheduler is None or \
+                isinstance(resource_or_response, http.Response):
+            return self.get_response(request, resource_or_response)
+        name = priority_class(resource_or_response, request.method)
+        # Wait no longer than the request's deadline allows.
+        try:
+            scheduler.acquire(name, request.time_remaining)
+        except http.GatewayTimeoutError:
+            return http.gateway_timeout()
+        try:
+            return self.get_response(request, resource_or_response)
+        finally:
+            scheduler.release(name)
+
     def get_response(self, request, resource_or_response):
         """
         Resolve the resource/response until we get a response.
@@ -63,7 +253,97 @@ class RestishApp(object):
         The resource_or_response arg may be either an http.Response instance or
         a callable resource. A callable resource may return another callable to
         use in its place.
+
+        Returns a 504 response if the request's deadline passes before a
+        callable is called.
         """
+        deadline = request.deadline
         while not isinstance(resource_or_response, http.Response):
+            if deadline is not None and time.time() >= deadline:
+                return http.gateway_timeout()
             resource_or_response = resource_or_response(request)
         return resource_or_response
+
+
+class MountApp(object):
+    """
+    WSGI application that dispatches each request to the application mounted
+    at the longest path prefix of the request's path, e.g. a request for
+    /api/users goes to the application mounted at '/api' rather than the one
+    mounted at '' (the root).
+
+    Applications can be mounted for a specific host, matched against the
+    request's Host header. Applications mounted for the request's host are
+    tried before those mounted for any host.
+
+    The mounted application is called with the prefix moved from the
+    environ's PATH_INFO to its SCRIPT_NAME. A request that matches no mounted
+    application gets a 404 response.
+
+    Finding the application costs at most one dict lookup per segment of the
+    longest mounted prefix, however many applications are mounted.
+    """
+
+    def __init__(self):
+        # Mount tables, keyed on host (None for any host). Each table is a
+        # (depth of the longest prefix, {prefix: application}) tuple.
+        self._mounts = {}
+
+    def mount(self, prefix, app, host=None):
+        """
+        Mount app, a WSGI application or a Resource instance (served by a
+        RestishApp), at the path prefix, e.g. '/api'.
+        """
+        if isinstance(app, Resource):
+            app = RestishApp(app)
+        prefix = '/' + prefix.strip('/') if prefix.strip('/') else ''
+        if host is not None:
+            host = _normalise_host(host)
+        depth, apps = self._mounts.get(host, (0, {}))
+        apps[prefix] = app
+        self._mounts[host] = max(depth, prefix.count('/')), apps
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        mounts = self._mounts
+        mount = None
+        if len(mounts) > 1 or None not in mounts:
+            host = environ.get('HTTP_HOST') or environ.get('SERVER_NAME', '')
+            mount = self._find_mount(mounts.get(_normalise_host(host)), path)
+        if mount is None:
+            mount = self._find_mount(mounts.get(None), path)
+        if mount is None:
+            status, headers, app_iter = http.not_found().wsgi_response()
+            start_response(status, headers)
+            return app_iter
+        prefix, app = mount
+        if prefix:
+            environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + prefix
+            environ['PATH_INFO'] = path[len(prefix):]
+        return app(environ, start_response)
+
+    def _find_mount(self, mounts, path):
+        """
+        Return the (prefix, application) for the longest prefix of the path in
+        the mount table, or None.
+        """
+        if mounts is None:
+            return None
+        depth, apps = mounts
+        parts = path.split('/', depth + 1)
+        for depth in xrange(min(depth, len(parts) - 1), -1, -1):
+            prefix = '/'.join(parts[:depth + 1])
+            app = apps.get(prefix)
+            if app is not None:
+                return prefix, app
+        return None
+
+
+def _normalise_host(host):
+    """
+    Lowercase the host and remove any port.
+    """
+    host = host.lower()
+    if host.rfind(':') > host.rfind(']'):
+        host = host[:host.rfind(':')]
+    return host
@@ -0,0 +1,143 @@
+"""
+Bounded caches used to remember decisions that are expensive to repeat on
+every request.
+"""
+
+import threading
+import time
+
+
+# Indexes into an LRUCache link.
+_PREV, _NEXT, _KEY, _VALUE = 0, 1, 2, 3
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping holding at most maxsize items. Once full, the least
+    recently used item is discarded to make room for a new one.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._links = {}
+        # Circular doubly linked list of [prev, next, key, value] links, most
+        # recently used first.
+        self._root = root = []
+        root[:] = [root, root, None, None]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._links)
+
+    def __contains__(self, key):
+        return key in self._links
+
+    def keys(self):
+        """
+        Return a list of the keys in the cache.
+        """
+        with self._lock:
+            return list(self._links)
+
+    def get(self, key, default=None):
+        """
+        Return the value for key, or default if key is not in the cache.
+        """
+        with self._lock:
+            link = self._links.get(key)
+            if link is None:
+                return default
+            self._move_to_front(link)
+            return link[_VALUE]
+
+    def set(self, key, value):
+        """
+        Set the value for key, discarding the least recently used item if the
+        cache is full.
+        """
+        with self._lock:
+            link = self._links.get(key)
+            if link is not None:
+                link[_VALUE] = value
+                self._move_to_front(link)
+                return
+            if len(self._links) >= self.maxsize:
+                if not self.maxsize:
+                    return
+                oldest = self._root[_PREV]
+                self._unlink(oldest)
+                del self._links[oldest[_KEY]]
+            root = self._root
+            link = [root, root[_NEXT], key, value]
+            root[_NEXT][_PREV] = link
+            root[_NEXT] = link
+            self._links[key] = link
+
+    def pop(self, key, default=None):
+        """
+        Remove key from the cache, returning its value or default if it was
+        not in the cache.
+        """
+        with self._lock:
+            link = self._links.pop(key, None)
+            if link is None:
+                return default
+            self._unlink(link)
+            return link[_VALUE]
+
+    def clear(self):
+        """
+        Remove all items from the cache.
+        """
+        with self._lock:
+            self._links.clear()
+            root = self._root
+            root[:] = [root, root, None, None]
+
+    def _unlink(self, link):
+        link[_PREV][_NEXT] = link[_NEXT]
+        link[_NEXT][_PREV] = link[_PREV]
+
+    def _move_to_front(self, link):
+        self._unlink(link)
+        root = self._root
+        link[_PREV] = root
+        link[_NEXT] = root[_NEXT]
+        root[_NEXT][_PREV] = link
+        root[_NEXT] = link
+
+
+class TTLCache(LRUCache):
+    """
+    An LRUCache whose items expire ttl seconds after they were set.
+    """
+
+    def __init__(self, maxsize, ttl, timer=time.time):
+        LRUCache.__init__(self, maxsize)
+        self.ttl = ttl
+        self._timer = timer
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        item = LRUCache.get(self, key)
+        if item is None:
+            return default
+        expires, value = item
+        if expires <= self._timer():
+            self.pop(key)
+            return default
+        return value
+
+    def set(self, key, value):
+        LRUCache.set(self, key, (self._timer() + self.ttl, value))
+
+    def pop(self, key, default=None):
+        item = LRUCache.pop(self, key)
+        if item is None:
+            return default
+        return item[1]
+
+
+_MISSING = object()
@@ -3,14 +3,35 @@ HTTP Request and Response objects, simple Response factories and exceptions
 types for common HTTP errors.
 """
 import cgi
+import threading
+import time
 import webob
+from webob.headers import ResponseHeaders
 
-from restish import error, url
+from restish import cache, error, url
 
 
 NO_BODY_RESPONSE_CODES = (204, 304)
 
 
+# Environ key of the (PATH_INFO, segments) cached by Request.path_info_segments.
+_PATH_INFO_SEGMENTS_KEY = 'restish.path_info_segments'
+
+
+# Environ key of the (QUERY_STRING, QueryDict) cached by Request.query_dict.
+_QUERY_DICT_KEY = 'restish.query_dict'
+
+# Environ key of the (key, {name: URL}) cache of Request's URL properties, and
+# the environ keys the URLs are built from. The cache is discarded when any of
+# those change.
+_URL_CACHE_KEY = 'restish.url_cache'
+_URL_ENVIRON_KEYS = ('wsgi.url_scheme', 'HTTP_HOST', 'SERVER_NAME',
+                     'SERVER_PORT', 'SCRIPT_NAME', 'PATH_INFO', 'QUERY_STRING')
+
+# Environ key of the request's deadline, see Request.deadline.
+_DEADLINE_KEY = 'restish.deadline'
+
+
 class Request(webob.Request):
     """
     HTTP request class.
@@ -21,45 +42,105 @@ class Request(webob.Request):
     Request is basically a webob.Request with one important difference:
     url-like properties are represented as url.URL instances to allow them
     to manipulated easily and safely.
+
+    The url-like properties are only worked out once per request, unless the
+    parts of the environ they depend on are changed.
+
+    Note: like webob's, a Request holds nothing but the environ; every other
+    attribute reads from, or writes to, the environ when it is accessed.
     """
 
     def __init__(self, environ):
         webob.Request.__init__(self, environ)
 
+    def _url_property(self, name):
+        """
+        Return the URL for the url-like property name, from the request's
+        cache if it is still valid.
+        """
+        environ = self.environ
+        key = tuple([environ.get(k) for k in _URL_ENVIRON_KEYS])
+        cached = environ.get(_URL_CACHE_KEY)
+        if cached is None or cached[0] != key:
+            cached = key, {}
+            environ[_URL_CACHE_KEY] = cached
+        urls = cached[1]
+        value = urls.get(name)
+        if value is None:
+            if name == 'application_path':
+                value = self.application_url.path
+            else:
+                value = url.URL(getattr(webob.Request, name).fget(self))
+            urls[name] = value
+        return value
+
+    @property
+    def path_info_segments(self):
+        """
+        Return the list of unicode segments of the path relative to the WSGI
+        application, i.e. of PATH_INFO. Raises UnicodeDecodeError if the path
+        is not UTF-8 encoded.
+
+        The segments are worked out once per request (and PATH_INFO).
+        """
+        environ = self.environ
+        path_info = environ.get('PATH_INFO', '')
+        cached = environ.get(_PATH_INFO_SEGMENTS_KEY)
+        if cached is None or cached[0] != path_info:
+            cached = path_info, url.split_path(path_info)
+            environ[_PATH_INFO_SEGMENTS_KEY] = cached
+        return list(cached[1])
+
+    @property
+    def query_dict(self):
+        """
+        Return the query parameters as a url.QueryDict of unicode names and
+        values.
+
+        The query is parsed once per request (and QUERY_STRING).
+        """
+        environ = self.environ
+        query = environ.get('QUERY_STRING', '')
+        cached = environ.get(_QUERY_DICT_KEY)
+        if cached is None or cached[0] != query:
+            cached = query, url.QueryDict(url.split_query(query))
+            environ[_QUERY_DICT_KEY] = cached
+        return cached[1]
+
     @property
     def host_url(self):
         """
         Return the host's URL, i.e. the URL of the HTTP server.
         """
-        return url.URL(super(Request, self).host_url)
+        return self._url_property('host_url')
 
     @property
     def application_url(self):
         """
         Return the WSGI application's URL.
         """
-        return url.URL(super(Request, self).application_url)
+        return self._url_property('application_url')
 
     @property
     def application_path(self):
         """
         Return the path part of the WSGI application's URL.
         """
-        return self.application_url.path
+        return self._url_property('application_path')
 
     @property
     def path_url(self):
         """
         Return the path's URL, i.e. the current URL without the query string.
         """
-        return url.URL(super(Request, self).path_url)
+        return self._url_property('path_url')
 
     @property
     def url(self):
         """
         Return the full current (i.e. requested), URL.
         """
-        return url.URL(super(Request, self).url)
+        return self._url_property('url')
 
     @property
     def path(self):
@@ -67,7 +148,7 @@ class Request(webob.Request):
         Return the path part of the current URL, relative to the root of the
         web server.
         """
-        return url.URL(super(Request, self).path)
+        return self._url_property('path')
 
     @property
     def path_qs(self):
@@ -75,7 +156,44 @@ class Request(webob.Request):
         Return the path of the current URL, relative to the root of the web
         server, and the query string.
         """
-        return url.URL(super(Request, self).path_qs)
+        return self._url_property('path_qs')
+
+    def _get_deadline(self):
+        return self.environ.get(_DEADLINE_KEY)
+
+    def _set_deadline(self, deadline):
+        if deadline is None:
+            self.environ.pop(_DEADLINE_KEY, None)
+        else:
+            self.environ[_DEADLINE_KEY] = deadline
+
+    deadline = property(_get_deadline, _set_deadline, doc="""
+        The time (as returned by time.time()) by which the request should be
+        answered, or None if the request has no deadline.
+
+        RestishApp answers a request with a 504 Gateway Timeout response once
+        its deadline has passed, see RestishApp's timeout args.
+        """)
+
+    @property
+    def time_remaining(self):
+        """
+        Return the number of seconds left until the request's deadline
+        (negative if it has passed), or None if the request has no deadline.
+        """
+        deadline = self.environ.get(_DEADLINE_KEY)
+        if deadline is None:
+            return None
+        return deadline - time.time()
+
+    def check_deadline(self):
+        """
+        Raise GatewayTimeoutError if the request's deadline has passed, e.g.
+        before starting work for the request.
+        """
+        deadline = self.environ.get(_DEADLINE_KEY)
+        if deadline is not None and time.time() >= deadline:
+            raise GatewayTimeoutError()
 
 
 class Response(webob.Response):
@@ -88,13 +206,45 @@ class Response(webob.Response):
 
     Response is basically just a webob.Response with a modified initializer and
     less implicit behaviour.
+
+    Creating a webob.Response is relatively expensive so a Response only
+    stores its status, headers and body until one of webob's attributes is
+    used. A response that is simply returned to the application is sent
+    without ever creating the webob response, see wsgi_response.
     """
 
     default_content_type = None
 
     def __init__(self, status, headers, body):
+        self.__dict__['_raw'] = status, headers or [], body
+
+    def __getattr__(self, name):
+        # Only called for attributes that are not found, e.g. the webob
+        # response's state before it is initialised.
+        if '_raw' not in self.__dict__:
+            raise AttributeError(name)
+        self._init_webob()
+        return getattr(self, name)
+
+    def __setattr__(self, name, value):
+        if '_raw' in self.__dict__:
+            self._init_webob()
+        webob.Response.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        if '_raw' in self.__dict__:
+            self._init_webob()
+        webob.Response.__delattr__(self, name)
+
+    def _init_webob(self):
+        """
+        Initialise the webob response from the stored status, headers and
+        body.
+        """
+        status, headers, body = self.__dict__.pop('_raw')
+        self.__dict__.pop('_canned', None)
         kwargs = {'status': status,
-                  'headerlist': headers}
+                  'headerlist': list(headers)}
         # XXX webob workaround. I can't see a way to create an empty response
         # *with* a content-length, as is common for a HEAD response. So, a
         # workaround is that if there is no body, i.e. None, then we capture
@@ -113,6 +263,165 @@ class Response(webob.Response):
         if content_length is not None:
             self.headers['Content-Length'] = content_length
 
+    def wsgi_response(self):
+        """
+        Return the (status, headerlist, app_iter) to send to the WSGI server.
+
+        If none of webob's attributes have been used the response is built
+        directly from the stored status, headers and body, exactly as webob
+        would have built it.
+        """
+        raw = self.__dict__.get('_raw')
+        if raw is not None:
+            canned = self.__dict__.get('_canned')
+            if canned is not None:
+                status, headers, body = canned
+                return status, list(headers), [body]
+            status, headers, body = raw
+            if type(status) is str and status[:3].isdigit() \
+                    and status[3:4] == ' ':
+                if body is None:
+                    return status, _with_content_length(headers, None), ['']
+                elif isinstance(body, str):
+                    return status, \
+                            _with_content_length(headers, str(len(body))), \
+                            [body]
+                else:
+                    return status, list(headers), body
+        return self.status, self.headerlist, self.app_iter
+
+
+class CannedResponse(object):
+    """
+    A response that is rendered once and can then be sent any number of times,
+    e.g. the 404 response for every missing resource.
+
+    Calling the canned response returns a new Response. The Response is sent
+    exactly as rendered unless it is changed first, in which case only that
+    Response is affected.
+    """
+
+    def __init__(self, status, headers, body):
+        headers = tuple(headers)
+        self._raw = status, headers, body
+        self._wsgi = (status,
+                      tuple(_with_content_length(headers, str(len(body)))),
+                      body)
+
+    def __call__(self):
+        response = Response(*self._raw)
+        response.__dict__['_canned'] = self._wsgi
+        return response
+
+
+class FrozenResponse(Response):
+    """
+    An immutable response that can be created once, e.g. at startup, and
+    returned by any number of requests in any thread:
+
+        ROBOTS = http.FrozenResponse('200 OK', [('Content-Type', 'text/plain')],
+                                     'User-agent: *\nDisallow:\n')
+
+    The status, header list and body (a str or None) are rendered when the
+    response is created. Changing the response raises a TypeError; copy() it
+    to get a mutable Response instead.
+    """
+
+    def __init__(self, status, headers, body):
+        if body is not None and not isinstance(body, str):
+            raise TypeError('FrozenResponse body must be a str or None')
+        headers = tuple(headers or ())
+        Response.__init__(self, status, headers, body)
+        self.__dict__['_original'] = status, headers, body
+        if body is None:
+            headers, app_iter = _with_content_length(headers, None), ('',)
+        else:
+            headers, app_iter = \
+                    _with_content_length(headers, str(len(body))), (body,)
+        self.__dict__['_wsgi'] = status, tuple(headers), app_iter
+        self.__dict__['_lock'] = threading.RLock()
+
+    def __getattr__(self, name):
+        if '_frozen' not in self.__dict__:
+            with self._lock:
+                # Initialise the webob response, unless this thread is
+                # already doing so.
+                if '_initialising' not in self.__dict__:
+                    self._init_webob()
+                    return getattr(self, name)
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if not self.__dict__.get('_initialising'):
+            raise TypeError('FrozenResponse is immutable, use copy()')
+        webob.Response.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        if not self.__dict__.get('_initialising'):
+            raise TypeError('FrozenResponse is immutable, use copy()')
+        webob.Response.__delattr__(self, name)
+
+    def _init_webob(self):
+        """
+        Initialise the webob response, once, and make its header list
+        immutable.
+        """
+        with self._lock:
+            if '_frozen' in self.__dict__:
+                return
+            self.__dict__['_initialising'] = True
+            try:
+                Response._init_webob(self)
+            finally:
+                del self.__dict__['_initialising']
+            headerlist = _FrozenList(self._headerlist)
+            self.__dict__['_headerlist'] = headerlist
+            self.__dict__['_headers'] = ResponseHeaders.view_list(headerlist)
+            self.__dict__['_frozen'] = True
+
+    def copy(self):
+        """
+        Return a mutable Response with the same status, headers and body.
+        """
+        status, headers, body = self._original
+        return Response(status, list(headers), body)
+
+    def wsgi_response(self):
+        status, headers, app_iter = self._wsgi
+        # Middleware may change the header list it is given.
+        return status, list(headers), app_iter
+
+
+class _FrozenList(list):
+    """
+    A list that cannot be changed.
+    """
+
+    def _frozen(self, *args, **kwargs):
+        raise TypeError('FrozenResponse is immutable, use copy()')
+
+    append = extend = insert = remove = pop = sort = reverse = _frozen
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = _frozen
+    __iadd__ = __imul__ = _frozen
+
+
+def _with_content_length(headers, content_length):
+    """
+    Return a copy of the headers with a single, last, Content-Length header.
+    If content_length is None, use the last existing Content-Length or '0'.
+    """
+    result = []
+    existing = None
+    for header in headers:
+        if header[0].lower() == 'content-length':
+            existing = header[1]
+        else:
+            result.append(header)
+    if content_length is None:
+        content_length = '0' if existing is None else existing
+    result.append(('Content-Length', content_length))
+    return result
+
 
 # Successful 2xx
 
@@ -415,11 +724,14 @@ def not_found(headers=None, body=None):
     when no other response is applicable.
     """
     if headers is None and body is None:
-        headers = [('Content-Type', 'text/plain')]
-        body = '404 Not Found'
+        return _NOT_FOUND()
     return Response("404 Not Found", headers, body)
 
 
+_NOT_FOUND = CannedResponse('404 Not Found', [('Content-Type', 'text/plain')],
+                            '404 Not Found')
+
+
 class NotFoundError(error.HTTPClientError):
     """ Exception for the 404 http code """
     response_factory = staticmethod(not_found)
@@ -435,9 +747,18 @@ def method_not_allowed(allow):
     """
     if isinstance(allow, list):
         allow = ', '.join(allow)
-    return Response("405 Method Not Allowed",
-          [('Content-Type', 'text/plain'), \
-           ('Allow', allow)], "405 Method Not Allowed")
+    canned = _method_not_allowed_cache.get(allow)
+    if canned is None:
+        canned = CannedResponse("405 Method Not Allowed",
+                                [('Content-Type', 'text/plain'),
+                                 ('Allow', allow)], "405 Method Not Allowed")
+        _method_not_allowed_cache.set(allow, canned)
+    return canned()
+
+
+# Canned 405 responses, keyed on the Allow header. There is typically one per
+# resource class.
+_method_not_allowed_cache = cache.LRUCache(1024)
 
 
 class MethodNotAllowedError(error.HTTPClientError):
@@ -600,11 +921,15 @@ def gateway_timeout(headers=None, body=None):
     attempting to complete the request.
     """
     if headers is None and body is None:
-        headers = [('Content-Type', 'text/plain')]
-        body = '504 Gateway Timeout'
+        return _GATEWAY_TIMEOUT()
     return Response('504 Gateway Timeout', headers, body)
 
 
+_GATEWAY_TIMEOUT = CannedResponse('504 Gateway Timeout',
+                                  [('Content-Type', 'text/plain')],
+                                  '504 Gateway Timeout')
+
+
 class GatewayTimeoutError(error.HTTPServerError):
     """
     504 Gateway Timeout exception.
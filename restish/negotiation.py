@@ -0,0 +1,113 @@
+"""
+Content negotiation.
+
+Matches the media types supported by a resource against the media ranges of a
+request's Accept (or Content-Type) header, see section 14.1 of RFC 2616.
+
+Media types are parsed into (type, subtype, params) tuples, where params is a
+tuple of the (name, value) parameters other than q. The media types supported
+by a resource never change so they are parsed once, when the resource is
+defined, leaving only the request's header to parse.
+"""
+
+
+def parse_media_type(media_type):
+    """
+    Parse a media type, e.g. 'text/html;level=1', into a (type, subtype,
+    params) tuple, or None if it is not a valid media type.
+    """
+    media_range = _parse_media_range(media_type)
+    if media_range is None:
+        return None
+    return media_range[:3]
+
+
+def parse_media_ranges(header):
+    """
+    Parse an Accept header into a list of (type, subtype, params, quality)
+    media ranges. Malformed media ranges are ignored.
+    """
+    media_ranges = []
+    for media_range in header.split(','):
+        media_range = _parse_media_range(media_range)
+        if media_range is not None:
+            media_ranges.append(media_range)
+    return media_ranges
+
+
+def best_match(supported, media_ranges):
+    """
+    Return the index of the supported media type (as returned by
+    parse_media_type) that best matches the media ranges, or None if none of
+    the supported media types are acceptable.
+
+    The best match is the media type that most specifically matches a media
+    range (an exact type beats a wildcard), then the one with the highest
+    quality. The first of equally good matches wins.
+    """
+    best, best_score = None, (-1, 0)
+    for index, media_type in enumerate(supported):
+        if media_type is None:
+            continue
+        score = _fitness_and_quality(media_type, media_ranges)
+        if score[1] and score > best_score:
+            best, best_score = index, score
+    return best
+
+
+def _parse_media_range(media_range):
+    """
+    Parse a single media range into a (type, subtype, params, quality) tuple,
+    or None if it is malformed.
+    """
+    parts = media_range.split(';')
+    full_type = parts[0].strip().lower()
+    # Java's URLConnection sends a single '*'. Turn it into a legal wildcard.
+    if full_type == '*':
+        full_type = '*/*'
+    type, sep, subtype = full_type.partition('/')
+    if not (type and sep and subtype) or '/' in subtype:
+        return None
+    params = []
+    quality = 1.0
+    for param in parts[1:]:
+        name, sep, value = param.partition('=')
+        name = name.strip()
+        if not (name and sep):
+            continue
+        if name == 'q':
+            try:
+                q = float(value)
+            except ValueError:
+                continue
+            if 0 <= q <= 1:
+                quality = q
+        else:
+            params.append((name, value.strip()))
+    return type.strip(), subtype.strip(), tuple(params), quality
+
+
+def _fitness_and_quality(media_type, media_ranges):
+    """
+    Return a (fitness, quality) tuple for the media range that best fits the
+    media type, or (-1, 0) if no media range matches.
+    """
+    type, subtype, params = media_type
+    best_fitness, best_quality = -1, 0
+    for range_type, range_subtype, range_params, quality in media_ranges:
+        if range_type != type and range_type != '*' and type != '*':
+            continue
+        if range_subtype != subtype and range_subtype != '*' \
+                and subtype != '*':
+            continue
+        fitness = 0
+        if range_type == type:
+            fitness += 100
+        if range_subtype == subtype:
+            fitness += 10
+        for param in params:
+            if param in range_params:
+                fitness += 1
+        if fitness > best_fitness:
+            best_fitness, best_quality = fitness, quality
+    return best_fitness, best_quality
@@ -0,0 +1,206 @@
+"""
+Offloading CPU-heavy request handlers to a pool of worker processes, so they
+do not hold the GIL, and stall every other thread, in the WSGI worker.
+
+A Resource method is offloaded by its decorator:
+
+    class Thumbnail(resource.Resource):
+
+        @resource.GET(offload='process')
+        def get(self, request):
+            ...
+
+The method is called in a worker process with a copy of the resource and of
+the request (its environ's str, number and tuple values, and its body). Both
+the resource's class and its instance attributes must be picklable, i.e. the
+class must be defined at the top level of a module. The method must return an
+http.Response, whose body is sent back to the WSGI worker as a str.
+
+The worker processes are started by configure(), which must be called at
+startup, before the WSGI server starts any threads:
+
+    offload.configure(processes=4, max_pending=16)
+
+Forking copies only the calling thread, so a worker process started while
+other threads hold locks (e.g. restish's own caches') could wait for them
+forever. Offloading a request before configure() has been called raises a
+TypeError.
+
+An offloaded request that arrives when max_pending requests are already
+offloaded gets a 503 Service Unavailable response. One that is still running
+when its deadline passes, see http.Request.deadline, gets a 504 Gateway
+Timeout response, but stays offloaded (and counts towards max_pending) until
+the worker process finishes it.
+"""
+
+import cPickle as pickle
+import multiprocessing
+import threading
+from cStringIO import StringIO
+
+from restish import http
+
+
+# Types of environ values that are copied to the worker process.
+_ENVIRON_TYPES = (str, unicode, int, long, float, bool, tuple, type(None))
+
+
+class ProcessPool(object):
+    """
+    A pool of processes (processes defaults to the number of CPUs) that
+    accepts at most max_pending calls (defaults to twice the number of
+    processes) at once.
+
+    The processes are started when the pool is created, so create it before
+    starting any threads.
+    """
+
+    def __init__(self, processes=None, max_pending=None):
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+        if max_pending is None:
+            max_pending = processes * 2
+        self.processes = processes
+        self.max_pending = max_pending
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._pool = multiprocessing.Pool(processes)
+
+    def call(self, func, args, timeout=None):
+        """
+        Call func(*args) in a worker process and return the result.
+
+        Raises http.ServiceUnavailableError if max_pending calls are already
+        pending or the pool is closed, or http.GatewayTimeoutError if the call does not finish within
+        timeout seconds. A call that times out is still pending until it
+        finishes in the worker process.
+        """
+        # Pickle the call here, so that unpicklable args raise now rather than
+        # in the pool's task handler thread.
+        call = pickle.dumps((func, args), pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            if self._pool is None or self._pending >= self.max_pending:
+                raise http.ServiceUnavailableError()
+            self._pending += 1
+            pool = self._pool
+        try:
+            result = pool.apply_async(_run, (call,), callback=self._finished)
+        except:
+            self._finished(None)
+            raise
+        try:
+            success, value = pickle.loads(result.get(timeout))
+        except multiprocessing.TimeoutError:
+            raise http.GatewayTimeoutError()
+        if not success:
+            raise value
+        return value
+
+    def close(self):
+        """
+        Stop the worker processes, once they have finished any pending calls.
+        """
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    def pending(self):
+        """
+        Return the number of calls that are pending, i.e. waiting for or
+        running in a worker process.
+        """
+        return self._pending
+
+    def _finished(self, result):
+        """
+        Count a call as no longer pending once the worker process has
+        finished it, however long the caller waited for it.
+        """
+        with self._lock:
+            self._pending -= 1
+
+
+# Pool used for offloaded request handlers.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configure(processes=None, max_pending=None):
+    """
+    Start the pool of processes used for offloaded request handlers,
+    replacing (and closing) the current pool.
+
+    Call this at startup, before any threads that serve requests exist.
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, ProcessPool(processes, max_pending)
+    if pool is not None:
+        pool.close()
+
+
+def get_pool():
+    """
+    Return the pool of processes used for offloaded request handlers.
+    """
+    pool = _pool
+    if pool is None:
+        raise TypeError("Please configure offload with offload.configure() "
+                        "at startup before offloading requests.")
+    return pool
+
+
+def offloaded(cls, name):
+    """
+    Return a request handler that calls the method cls.name (a
+    @GET(...)-decorated method, etc) in a worker process.
+    """
+    def handler(self, request):
+        environ = dict((key, value)
+                       for key, value in request.environ.iteritems()
+                       if isinstance(value, _ENVIRON_TYPES))
+        status, headers, body = get_pool().call(
+            _call, (cls, name, self, environ, request.body),
+            request.time_remaining)
+        return http.Response(status, headers, body)
+    return handler
+
+
+def _run(call):
+    """
+    Run a pickled call in the worker process, returning the pickled (success,
+    result or exception) so that, whatever happens, the pool reports success
+    and ProcessPool._finished is called.
+    """
+    try:
+        func, args = pickle.loads(call)
+        result = True, func(*args)
+    except Exception as e:
+        result = False, e
+    try:
+        return pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        return pickle.dumps((False, TypeError(
+            'Offloaded call result cannot be pickled: %s' % (e,))),
+            pickle.HIGHEST_PROTOCOL)
+
+
+def _call(cls, name, resource, environ, body):
+    """
+    Call the handler in the worker process, returning the response as a
+    (status, headers, body) tuple.
+    """
+    environ['wsgi.input'] = StringIO(body)
+    environ['CONTENT_LENGTH'] = str(len(body))
+    response = getattr(cls, name).func(resource, http.Request(environ))
+    if not isinstance(response, http.Response):
+        raise TypeError('Offloaded request handler must return a Response')
+    status, headers, app_iter = response.wsgi_response()
+    try:
+        body = ''.join(app_iter)
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+    return status, headers, body
@@ -2,16 +2,24 @@
 Base Resource class and associates methods for children and content negotiation
 """
 
+import itertools
 import mimetypes
 import re
-import mimeparse
+import uuid
 
-from restish import http
+from restish import cache, http, negotiation, url
 
 
 _RESTISH_CHILD = "restish_child"
 _RESTISH_METHOD = "restish_method"
 _RESTISH_MATCH = "restish_match"
+_RESTISH_CACHEABLE = "restish_cacheable"
+_RESTISH_SHARED = "restish_shared"
+_RESTISH_NEGATIVE_CACHE = "restish_negative_cache"
+
+
+# Number of instances of a shared child kept by @child(shared=True).
+DEFAULT_SHARED_CHILDREN = 1024
 
 
 SHORT_CONTENT_TYPE_EXTRA = {
@@ -40,13 +48,63 @@ def _gather_request_dispatchers(cls, clsattrs):
     for wrapper in _find_annotated_funcs(clsattrs, _RESTISH_METHOD):
         method = getattr(wrapper, _RESTISH_METHOD, None)
         match = getattr(wrapper, _RESTISH_MATCH)
-        request_dispatchers.setdefault(method, []).append(
-            (wrapper.func, match))
+        func = wrapper.func
+        if match.get('offload') == 'process':
+            func = _offloaded(cls, clsattrs, wrapper)
+        request_dispatchers.setdefault(method, []).append((func, match))
     # Append any handlers that were added by base classes.
     for method, dispatchers in getattr(cls, 'request_dispatchers', {}).iteritems():
         request_dispatchers.setdefault(method, []).extend(dispatchers)
     # Set the handlers on the class.
     cls.request_dispatchers = request_dispatchers
+    _prepare_request_dispatch(cls)
+
+
+def _offloaded(cls, clsattrs, wrapper):
+    """
+    Return a request handler that calls the wrapped method in a worker
+    process, see restish.offload.
+    """
+    # Import here so that multiprocessing is only loaded when it is used.
+    from restish import offload
+    for name, value in clsattrs.iteritems():
+        if value is wrapper:
+            return offload.offloaded(cls, name)
+
+
+def _prepare_request_dispatch(cls):
+    """
+    Precompute what Resource.__call__ needs to dispatch a request without
+    inspecting the class's request_dispatchers every time.
+
+    The Allow header of a 405 response is known in advance. A method with a
+    single dispatcher that accepts and produces any content type is recorded
+    in the class's _wildcard_dispatchers table; a request without Accept and
+    Content-Type headers can go straight to it, skipping negotiation.
+
+    The priority class of a request for a method whose dispatchers all declare
+    the same priority_class is also recorded, see priority_class(). A HEAD
+    request, which is usually answered by the GET dispatcher, is in the GET
+    dispatchers' class unless HEAD dispatchers declare their own.
+
+    Note: call this again if request_dispatchers is changed after the class is
+    created.
+    """
+    cls._allowed_methods = ', '.join(cls.request_dispatchers)
+    cls._priority_classes = {}
+    for method, dispatchers in cls.request_dispatchers.iteritems():
+        classes = set(match.get('priority_class')
+                      for func, match in dispatchers)
+        if len(classes) == 1 and None not in classes:
+            cls._priority_classes[method] = classes.pop()
+    if 'HEAD' not in cls._priority_classes and 'GET' in cls._priority_classes:
+        cls._priority_classes['HEAD'] = cls._priority_classes['GET']
+    cls._wildcard_dispatchers = dict(
+        (method, dispatchers[0][0])
+        for method, dispatchers in cls.request_dispatchers.iteritems()
+        if len(dispatchers) == 1 and
+            dispatchers[0][1]['accept'] == ['*/*'] and
+            dispatchers[0][1]['content_type'] == ['*/*'])
 
 
 def _gather_child_factories(cls, clsattrs):
@@ -63,6 +121,75 @@ def _gather_child_factories(cls, clsattrs):
     # Sort the child factories by score.
     cls.child_factories = sorted(cls.child_factories, \
                                  key=lambda i: i[0].score, reverse=True)
+    _index_child_factories(cls)
+
+
+def _index_child_factories(cls):
+    """
+    Build a table of the class's child factories keyed on the literal first
+    segment of their matcher.
+
+    Each entry lists, in score order, the child factories that could match a
+    path whose first segment is the key: those whose matcher starts with that
+    literal and those whose matcher does not start with a literal at all (e.g.
+    '{name}', resource.any or a custom matcher). Paths whose first segment is
+    not in the table only need to try the latter.
+    """
+    literals = {}
+    fallback = []
+    for index, (matcher, func) in enumerate(cls.child_factories):
+        literal = getattr(matcher, 'literal', None)
+        if literal is None:
+            fallback.append(index)
+        else:
+            literals.setdefault(literal, []).append(index)
+    factories = cls.child_factories
+    cls._child_factory_index = dict(
+        (literal, _group_child_factories(
+            [factories[i] for i in sorted(indexes + fallback)]))
+        for literal, indexes in literals.iteritems())
+    cls._child_factory_fallback = _group_child_factories(
+        [factories[i] for i in fallback])
+
+
+# Maximum number of regex groups in a _TemplateChildMatcherGroup. Python's re
+# module refuses to compile patterns with 100 or more groups.
+_MAX_GROUP_REGEX_GROUPS = 99
+
+
+def _group_child_factories(factories):
+    """
+    Replace runs of consecutive TemplateChildMatcher child factories with a
+    _TemplateChildMatcherGroup (paired with None instead of a child factory)
+    that matches the whole run with a single regex scan.
+    """
+    grouped = []
+    run = []
+    run_groups = 0
+    def flush():
+        if len(run) > 1:
+            try:
+                grouped.append((_TemplateChildMatcherGroup(run), None))
+            except UnicodeDecodeError:
+                # Non-ASCII byte string templates cannot be mixed into a
+                # unicode regex; leave them to match on their own.
+                grouped.extend(run)
+        else:
+            grouped.extend(run)
+        del run[:]
+    for matcher, func in factories:
+        if not isinstance(matcher, TemplateChildMatcher):
+            flush()
+            grouped.append((matcher, func))
+            continue
+        groups = 1 + len([1 for segment in matcher._segments if segment[1]])
+        if run_groups + groups > _MAX_GROUP_REGEX_GROUPS:
+            flush()
+            run_groups = 0
+        run.append((matcher, func))
+        run_groups += groups
+    flush()
+    return grouped
 
 
 def _find_annotated_funcs(clsattrs, annotation):
@@ -81,19 +208,28 @@ class MethodDecorator(object):
 
     method = None
 
-    def __init__(self, accept='*/*', content_type='*/*'):
+    def __init__(self, accept='*/*', content_type='*/*', priority_class=None,
+                 offload=None):
+        if offload not in (None, 'process'):
+            raise ValueError('Unknown offload %r' % (offload,))
         if not isinstance(accept, list):
             accept = [accept]
         if not isinstance(content_type, list):
             content_type = [content_type]
         accept = [_normalise_mimetype(a) for a in accept]
         content_type = [_normalise_mimetype(a) for a in content_type]
-        self.match = {'accept': accept, 'content_type': content_type}
+        self.match = {'accept': accept, 'content_type': content_type,
+                      'priority_class': priority_class, 'offload': offload}
+        # Parse the media types now, rather than during every negotiation.
+        for name in ['accept', 'content_type']:
+            self.match['parsed_' + name] = \
+                    [negotiation.parse_media_type(t) for t in self.match[name]]
 
     def __call__(self, func):
         wrapper = ResourceMethodWrapper(func)
         setattr(wrapper, _RESTISH_METHOD, self.method)
         setattr(wrapper, _RESTISH_MATCH, self.match)
+        wrapper.priority_class = self.match['priority_class']
         return wrapper
 
 
@@ -110,6 +246,8 @@ class ResourceMethodWrapper(object):
     a whole suite of dispatchers to worry about.
     """
 
+    priority_class = None
+
     def __init__(self, func):
         self.func = func
 
@@ -121,13 +259,29 @@ class ResourceMethodWrapper(object):
         if request.method != method:
             return http.method_not_allowed([method])
         # Look for a dispatcher.
-        dispatcher, reason = _best_dispatcher([(self.func, match)], request)
+        dispatcher, reason, content_type = \
+                _negotiate(self, [(self.func, match)], request)
         if dispatcher is not None:
-            return _dispatch(request, match, self.func)
+            return _complete_response(self.func(request), content_type)
         # No dispatcher.
         return _best_dispatcher_error_response(reason)
 
 
+def priority_class(resource, method):
+    """
+    Return the priority class of a request for method to the resource.
+
+    The priority class is the one given to the method's decorator, e.g.
+    @GET(priority_class='export'), or the resource's priority_class attribute.
+    """
+    classes = getattr(resource, '_priority_classes', None)
+    if classes is not None:
+        name = classes.get(method)
+        if name is not None:
+            return name
+    return getattr(resource, 'priority_class', None)
+
+
 def _normalise_mimetype(mimetype):
     """
     Expand any shortcut mimetype names into a full mimetype
@@ -182,33 +336,66 @@ class Resource(object):
 
     __metaclass__ = _metaResource
 
+    # Priority class of requests to the resource, see restish.scheduler.
+    priority_class = None
+
     def resource_child(self, request, segments):
-        for matcher, func in self.child_factories:
+        if segments:
+            child_factories = self._child_factory_index.get(
+                segments[0], self._child_factory_fallback)
+        else:
+            child_factories = self._child_factory_fallback
+        for matcher, func in child_factories:
             match = matcher(request, segments)
             if match is not None:
                 break
         else:
             return None
-        match_args, match_kwargs, segments = match
-        result = func(self, request, segments, *match_args, **match_kwargs)
+        # A group of matchers also returns the child factory that matched.
+        if func is None:
+            func, match = match
+        match_args, match_kwargs, remaining = match
+        missing = getattr(func, _RESTISH_NEGATIVE_CACHE, None)
+        if missing is not None:
+            parent = _parent_key(self, request, segments)
+            if missing.has_match(match_args, match_kwargs, parent):
+                return None
+        instances = getattr(func, _RESTISH_SHARED, None)
+        if instances is None:
+            result = func(self, request, remaining, *match_args,
+                          **match_kwargs)
+        else:
+            result = _shared_child(instances, func, self, request, segments,
+                                   remaining, match_args, match_kwargs)
         if result is None:
+            if missing is not None:
+                missing.add_match(match_args, match_kwargs, parent)
             return None
-        elif isinstance(result, tuple):
-            return result
-        else:
-            return result, segments
+        elif not isinstance(result, tuple):
+            result = result, remaining
+        if getattr(func, _RESTISH_CACHEABLE, False):
+            return CacheableChild(result)
+        return result
 
     def __call__(self, request):
+        method = request.method
+        environ = request.environ
+        # Nothing to negotiate, call the method's only dispatcher directly.
+        if 'HTTP_ACCEPT' not in environ and not environ.get('CONTENT_TYPE'):
+            func = self._wildcard_dispatchers.get(method)
+            if func is not None:
+                return func(self, request)
         # Get the dispatchers for the request method.
-        dispatchers = self.request_dispatchers.get(request.method)
+        dispatchers = self.request_dispatchers.get(method)
         # No dispatchers for method, send 405 with list of allowed methods.
         if dispatchers is None:
-            return http.method_not_allowed(', '.join(self.request_dispatchers))
+            return http.method_not_allowed(self._allowed_methods)
         # Look up the best dispatcher
-        dispatcher, reason = _best_dispatcher(dispatchers, request)
+        dispatcher, reason, content_type = \
+                _negotiate(self.__class__, dispatchers, request)
         if dispatcher is not None:
-            (callable, match) = dispatcher
-            return _dispatch(request, match, lambda r: callable(self, r))
+            return _complete_response(dispatcher[0](self, request),
+                                      content_type)
         # No match
         return _best_dispatcher_error_response(reason)
 
@@ -230,6 +417,8 @@ class Resource(object):
         response = self(request)
         while not isinstance(response, http.Response):
             response = response(request)
+        if isinstance(response, http.FrozenResponse):
+            response = response.copy()
         content_length = response.headers.get('content-length')
         response.body = ''
         if content_length is not None:
@@ -237,29 +426,104 @@ class Resource(object):
         return response
 
 
-def _dispatch(request, match, func):
-    response = func(request)
-    # Try to autocomplete the content-type header if not set
-    # explicitly.
-    # If there's no accept from the client and there's only one
-    # possible type from the match then use that as the best match.
-    # Otherwise use mimeparse to work out what the best match was. If
-    # the best match if not a wildcard then we know what content-type
-    # should be.
-    if isinstance(response, http.Response) and \
-            response.status_int not in http.NO_BODY_RESPONSE_CODES and \
+def _complete_response(response, content_type):
+    """
+    Complete a dispatcher's response using the outcome of negotiation.
+    """
+    # Try to autocomplete the content-type header, using the content type
+    # found during negotiation, if not set explicitly.
+    if content_type is None or not isinstance(response, http.Response):
+        return response
+    # Check the stored status and headers while the response has not
+    # created its webob response, and keep it that way.
+    raw = response.__dict__.get('_raw')
+    if raw is not None:
+        status, headers, body = raw
+        if type(status) is str and status[:3].isdigit():
+            existing = [value for (name, value) in headers
+                        if name.lower() == 'content-type']
+            if int(status[:3]) in http.NO_BODY_RESPONSE_CODES or \
+                    (existing and existing[-1]):
+                return response
+            if not existing:
+                return http.Response(status,
+                                     list(headers) +
+                                     [('Content-Type', content_type)],
+                                     body)
+    if response.status_int not in http.NO_BODY_RESPONSE_CODES and \
             not response.headers.get('content-type'):
-        accept = str(request.accept)
-        if not accept and len(match['accept']) == 1:
-            best_match = match['accept'][0]
-        else:
-            # XXX mimeparse picks *last* matching item so we reverse.
-            best_match = mimeparse.best_match(match['accept'][::-1], accept)
-        if '*' not in best_match:
-            response.headers['content-type'] = best_match
+        if isinstance(response, http.FrozenResponse):
+            response = response.copy()
+        response.headers['content-type'] = content_type
     return response
 
 
+# Cache of recent content negotiation decisions, see _negotiate.
+_negotiation_cache = cache.LRUCache(1024)
+
+
+def _negotiate(owner, dispatchers, request):
+    """
+    Find the best dispatcher for the request, see _best_dispatcher, and the
+    content type of a response from it.
+
+    The decision only depends on the dispatchers and the request's method,
+    Content-Type and Accept headers so it is cached, keyed on those headers
+    and the dispatchers' owner (i.e. a Resource class or decorated function).
+
+    Returns a (dispatcher, reason, content_type) tuple.
+    """
+    environ = request.environ
+    key = (owner, request.method, environ.get('CONTENT_TYPE'),
+           environ.get('HTTP_ACCEPT'))
+    decision = _negotiation_cache.get(key)
+    if decision is None:
+        dispatcher, reason = _best_dispatcher(dispatchers, request)
+        content_type = None
+        if dispatcher is not None:
+            content_type = _response_content_type(dispatcher[1], request)
+        decision = dispatcher, reason, content_type
+        _negotiation_cache.set(key, decision)
+    return decision
+
+
+def _response_content_type(match, request):
+    """
+    Work out the content type of a response from a dispatcher with the given
+    match, or None if it cannot be known.
+    """
+    # If there's no accept from the client and there's only one
+    # possible type from the match then use that as the best match.
+    # Otherwise work out what the best match was, treating no accept as
+    # accepting anything. If the best match if not a wildcard then we know
+    # what content-type should be.
+    media_ranges = _accept_media_ranges(request)
+    if not media_ranges and len(match['accept']) == 1:
+        best_match = match['accept'][0]
+    else:
+        best = negotiation.best_match(match['parsed_accept'],
+                                      media_ranges or _ANY_MEDIA_RANGES)
+        if best is None:
+            return None
+        best_match = match['accept'][best]
+    if '*' in best_match:
+        return None
+    return best_match
+
+
+# Media ranges equivalent to not sending an Accept header.
+_ANY_MEDIA_RANGES = negotiation.parse_media_ranges('*/*')
+
+
+def _accept_media_ranges(request):
+    """
+    Return the parsed media ranges of the request's Accept header. A missing
+    or completely malformed header results in an empty list.
+    """
+    return negotiation.parse_media_ranges(
+        request.environ.get('HTTP_ACCEPT', ''))
+
+
 def _best_dispatcher(dispatchers, request):
     """
     Find the best dispatcher for the request. If no dispatcher is found a
@@ -269,15 +533,15 @@ def _best_dispatcher(dispatchers, request):
     # only those that match.
 
     # For content type.
-    content_type = request.headers.get('content-type')
+    content_type = request.environ.get('CONTENT_TYPE')
     if content_type:
-        dispatchers = _filter_dispatchers_on_content_type(dispatchers,
-                                                          str(content_type))
+        dispatchers = _filter_dispatchers_on_content_type(
+            dispatchers, negotiation.parse_media_ranges(content_type))
     if not dispatchers:
         return None, 415
 
     # For accept.
-    accept = str(request.accept)
+    accept = _accept_media_ranges(request)
     if accept:
         dispatchers = _filter_dispatchers_on_accept(dispatchers, accept)
     if not dispatchers:
@@ -290,11 +554,17 @@ def _best_dispatcher(dispatchers, request):
 def _best_dispatcher_error_response(reason):
     """ Create an HTTP response for a _best_dispatcher failure. """
     if reason == 406:
-        return http.not_acceptable([('Content-Type', 'text/plain')], \
-                                    '406 Not Acceptable')
+        return _NOT_ACCEPTABLE()
     elif reason == 415:
-        return http.unsupported_media_type([('Content-Type', 'text/plain')], \
-                                           '415 Unsupported Media Type')
+        return _UNSUPPORTED_MEDIA_TYPE()
+
+
+_NOT_ACCEPTABLE = http.CannedResponse(
+    '406 Not Acceptable', [('Content-Type', 'text/plain')],
+    '406 Not Acceptable')
+_UNSUPPORTED_MEDIA_TYPE = http.CannedResponse(
+    '415 Unsupported Media Type', [('Content-Type', 'text/plain')],
+    '415 Unsupported Media Type')
 
 
 def _filter_dispatchers_on_content_type(dispatchers, content_type):
@@ -305,21 +575,178 @@ def _filter_dispatchers_on_accept(dispatchers, accept):
     return _filter_dispatchers_on_match(dispatchers, 'accept', accept)
 
 
-def _filter_dispatchers_on_match(dispatchers, match, value):
+def _filter_dispatchers_on_match(dispatchers, match, media_ranges):
     # Build an ordered list of the supported types.
     supported = []
+    parsed_supported = []
     for d in dispatchers:
         supported.extend(d[1][match])
+        parsed_supported.extend(d[1]['parsed_' + match])
     # Find the best match
-    # XXX mimeparse picks *last* matching item so we reverse.
-    supported.reverse()
-    best_match = mimeparse.best_match(supported, value)
+    best = negotiation.best_match(parsed_supported, media_ranges)
+    if best is None:
+        return []
+    best_match = supported[best]
     # Return the matching dispatchers
     return [d for d in dispatchers if best_match in d[1][match]]
 
 
-def child(matcher=None):
-    """ Child decorator used for finding child resources """
+class CacheableChild(tuple):
+    """
+    The (resource, segments) tuple returned by Resource.resource_child for a
+    child declared with @child(..., cacheable=True).
+
+    The application may remember the child resource for the path it was
+    located at instead of traversing to it again, see RestishApp.
+    """
+
+
+def _match_key(args, kwargs):
+    """
+    Return a hashable key for a child factory's match args, or None if the
+    match args are unhashable, e.g. from a custom matcher.
+    """
+    key = tuple(args), tuple(sorted(kwargs.iteritems()))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _parent_key(resource, request, segments):
+    """
+    Return a key for the parent resource's place in the application: its
+    class and the path to it, i.e. the request's path less the segments that
+    remain to be traversed.
+
+    Returns None if the segments are not what remains of the request's path,
+    i.e. the parent's path is not known.
+    """
+    path = request.path_info_segments
+    consumed = len(path) - len(segments)
+    if consumed < 0 or path[consumed:] != list(segments):
+        return None
+    return (type(resource), request.environ.get('SCRIPT_NAME', ''),
+            tuple(path[:consumed]))
+
+
+def _child_key(resource, request, segments, args, kwargs):
+    """
+    Return a hashable key for a child found by a child factory of the
+    resource, i.e. the parent's key (see _parent_key) and the match args, or
+    None if there is none.
+    """
+    key = _match_key(args, kwargs)
+    if key is None:
+        return None
+    parent = _parent_key(resource, request, segments)
+    if parent is None:
+        return None
+    return parent, key
+
+
+def _shared_child(instances, func, resource, request, segments, remaining,
+                  args, kwargs):
+    """
+    Call a shared child factory, reusing the child it returned the last time
+    it was called at the same place (see _parent_key) with the same match
+    args.
+
+    The segments are those the parent was asked to traverse, the remaining
+    segments those left once the child factory matched.
+    """
+    key = _child_key(resource, request, segments, args, kwargs)
+    if key is None:
+        return func(resource, request, remaining, *args, **kwargs)
+    child = instances.get(key)
+    if child is None:
+        child = func(resource, request, remaining, *args, **kwargs)
+        # Only share plain child resources: the remaining segments returned
+        # in a tuple depend on the request and responses are not reusable.
+        if child is not None and \
+                not isinstance(child, (tuple, http.Response)):
+            instances.set(key, child)
+    return child
+
+
+class NegativeCache(object):
+    """
+    Remembers, for ttl seconds, the match args of a child factory that found
+    no child, so that requests for the same missing child are rejected
+    without calling the factory again. At most maxsize match args are
+    remembered.
+
+    Missing children are remembered per parent, i.e. per parent class and
+    path to the parent (see _parent_key). Nothing is remembered for a parent
+    whose path is not known.
+
+    Call invalidate with the match args when the child is created, e.g.
+    missing_users.invalidate(id=user.id).
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self._cache = cache.TTLCache(maxsize, ttl)
+
+    def has_match(self, args, kwargs, parent):
+        """
+        Return True if the match args were recently found to have no child of
+        the parent (a parent key, or None if unknown).
+        """
+        key = _match_key(args, kwargs)
+        return key is not None and parent is not None and \
+                (parent, key) in self._cache
+
+    def add_match(self, args, kwargs, parent):
+        """
+        Remember that the match args have no child of the parent (a parent
+        key, or None if unknown).
+        """
+        key = _match_key(args, kwargs)
+        if key is not None and parent is not None:
+            self._cache.set((parent, key), True)
+
+    def invalidate(self, *args, **kwargs):
+        """
+        Forget that the child with the given match args was missing, for
+        every parent.
+        """
+        key = _match_key(args, kwargs)
+        if key is not None:
+            for cached in self._cache.keys():
+                if cached[1] == key:
+                    self._cache.pop(cached)
+
+    def clear(self):
+        """
+        Forget all missing children.
+        """
+        self._cache.clear()
+
+
+def child(matcher=None, cacheable=False, shared=False, negative_cache=None):
+    """
+    Child decorator used for finding child resources.
+
+    If cacheable is True the child factory promises to return the same child
+    resource for the same path segments, whatever the rest of the request.
+    The application may then cache the child and skip traversal to it.
+
+    If shared is True, or the maximum number of instances to keep, the child
+    factory promises that the child it returns depends only on the match args
+    and the parent's path, and is never modified. The child is then created
+    once per parent class, parent path and match args, and shared by all
+    requests for it. Note that a parent found at the same path in different
+    applications mounted with the same SCRIPT_NAME (e.g. for different hosts)
+    is considered the same parent.
+
+    If negative_cache is given, a NegativeCache (or True for a default one),
+    the match args for which the child factory returns None are remembered,
+    per parent class and parent path, and the child factory is not called for
+    them again until they expire or are invalidated. The child factory
+    promises that whether a child exists depends only on the match args and
+    the parent's path. Pass a NegativeCache to be able to invalidate it.
+    """
     def decorator(func, matcher=matcher):
         # No matcher? Use the function name.
         if matcher is None:
@@ -330,54 +757,233 @@ def child(matcher=None):
             matcher = TemplateChildMatcher(matcher)
         # Annotate the function.
         setattr(func, _RESTISH_CHILD, matcher)
+        if cacheable:
+            setattr(func, _RESTISH_CACHEABLE, True)
+        if shared:
+            maxsize = DEFAULT_SHARED_CHILDREN if shared is True else shared
+            setattr(func, _RESTISH_SHARED, cache.LRUCache(maxsize))
+        if negative_cache:
+            missing = negative_cache
+            if missing is True:
+                missing = NegativeCache()
+            setattr(func, _RESTISH_NEGATIVE_CACHE, missing)
         # Return the function (unwrapped).
         return func
     return decorator
 
 
+# Only ASCII digits, unicode.isdigit() and int() also accept other scripts'.
+_DIGITS = re.compile(r'[0-9]+\Z')
+
+
+def _convert_int(segment):
+    """ Convert a segment of ASCII decimal digits to an int """
+    if _DIGITS.match(segment) is None:
+        raise ValueError(segment)
+    return int(segment)
+
+
+def _convert_uuid(segment):
+    """ Convert a segment to a uuid.UUID """
+    return uuid.UUID(segment)
+
+
+# Converters available to {name:converter} segments of a TemplateChildMatcher.
+# A converter is called with the unquoted, decoded segment and should raise
+# ValueError if the segment cannot be converted. None means the segment is
+# passed through unchanged.
+CHILD_CONVERTERS = {
+        'str': None,
+        'int': _convert_int,
+        'uuid': _convert_uuid,
+        }
+
+
 class TemplateChildMatcher(object):
     """
     A @child matcher that parses a template in the form /fixed/{dynamic}/fixed,
     extracting segments inside {} markers.
+
+    A dynamic segment may name a converter, e.g. {id:int} or {key:uuid}, from
+    CHILD_CONVERTERS. The converted value is passed to the child factory and
+    the template does not match if the conversion fails. Dynamic segments
+    without a converter, or with the 'str' converter, are passed as unicode.
+    A dynamic segment with a converter is more specific than one without.
+
+    If the template starts with a fixed segment it is available as the
+    matcher's literal attribute (None otherwise). Resource uses it to skip
+    matchers that cannot possibly match.
+
+    The matcher can also be reversed, see format.
     """
 
     def __init__(self, pattern):
         self.pattern = pattern
-        self._calc_score()
         self._compile()
+        self._calc_score()
+        self.literal = self._segments[0][0]
 
     def _calc_score(self):
-        """ Return the score for this element """
+        """
+        Return the score for this element. Fixed segments score highest,
+        followed by dynamic segments with a converter.
+        """
         def score(segment):
-            if len(segment) >= 2 and segment[0] == '{' and segment[-1] == '}':
-                return 0
-            return 1
-        segments = self.pattern.split('/')
-        self.score = tuple(score(segment) for segment in segments)
+            literal, name, converter = segment
+            if name is None:
+                return 1
+            if converter is not None:
+                return 0.5
+            return 0
+        self.score = tuple(score(segment) for segment in self._segments)
 
     def _compile(self):
-        """ compile the regexp to match segments """
-        def re_segments(segments):
-            for segment in segments:
-                if len(segment) >= 2 and \
-                   segment[0] == '{' and segment[-1] == '}':
-                    yield '(?P<%s>.*?)' % segment[1:-1]
+        """
+        Compile the template to a list of (literal, name, converter) tuples,
+        one per segment. Fixed segments have a name of None.
+        """
+        def compile_segment(segment):
+            if len(segment) >= 2 and segment[0] == '{' and segment[-1] == '}':
+                name, _, converter = segment[1:-1].partition(':')
+                try:
+                    converter = CHILD_CONVERTERS[converter or 'str']
+                except KeyError:
+                    raise ValueError('Unknown converter %r in child template '
+                                     '%r' % (converter, self.pattern))
+                return None, str(name), converter
+            return segment, None, None
+        self._segments = [compile_segment(segment)
+                          for segment in self.pattern.split('/')]
+        self._count = len(self._segments)
+        # Format string for the quoted path, with the fixed segments already
+        # quoted.
+        self._path_format = '/'.join(
+            url.quote_segment(literal).replace('%', '%%') if name is None
+            else '%%(%s)s' % name
+            for literal, name, converter in self._segments)
+
+    def format(self, **kwargs):
+        """
+        Return the quoted path that the template matches for the given
+        dynamic segment values, e.g. 'entries/2009/1' for a template of
+        'entries/{year:int}/{month:int}' and year=2009, month=1.
+
+        Raises ValueError if a value is missing or would not match its
+        segment's converter.
+        """
+        values = {}
+        for literal, name, converter in self._segments:
+            if name is None:
+                continue
+            try:
+                value = kwargs[name]
+            except KeyError:
+                raise ValueError('No value for %r in child template %r'
+                                 % (name, self.pattern))
+            if not isinstance(value, basestring):
+                value = unicode(value)
+            if converter is not None:
+                try:
+                    converter(value)
+                except ValueError:
+                    raise ValueError('Invalid value %r for %r in child '
+                                     'template %r' % (value, name,
+                                                      self.pattern))
+            values[name] = url.quote_segment(value)
+        return self._path_format % values
+
+    def __call__(self, request, segments):
+        if len(segments) < self._count:
+            return None
+        kwargs = {}
+        for (literal, name, converter), segment in \
+                itertools.izip(self._segments, segments):
+            if name is None:
+                if segment != literal:
+                    return None
+            elif converter is None:
+                kwargs[name] = segment
+            else:
+                try:
+                    kwargs[name] = converter(segment)
+                except ValueError:
+                    return None
+        return [], kwargs, segments[self._count:]
+
+
+# Regular expressions that match the segments accepted by a converter. Others
+# match any segment and leave the converter to reject it.
+_CONVERTER_PATTERNS = {
+        _convert_int: r'[0-9]+',
+        }
+
+
+class _TemplateChildMatcherGroup(object):
+    """
+    Match a list of (TemplateChildMatcher, child factory) pairs using a single
+    regular expression that is an alternation of all the templates, in order.
+
+    Returns a (child factory, match) tuple for the first template that matches
+    or None if there is no match.
+    """
+
+    def __init__(self, factories):
+        self.factories = list(factories)
+        self._count = max(matcher._count for matcher, func in factories)
+        self._groups = {}
+        patterns = []
+        group = 0
+        for index, (matcher, func) in enumerate(factories):
+            group += 1
+            outer = group
+            parts = []
+            names = []
+            for literal, name, converter in matcher._segments:
+                if name is None:
+                    parts.append(re.escape(literal))
                 else:
-                    yield re.escape(segment)
-        segments = self.pattern.split('/')
-        self._count = len(segments)
-        self._regex = re.compile('^' + '\\/'.join(re_segments(segments)) + '$')
+                    group += 1
+                    parts.append(u'(%s)' % _CONVERTER_PATTERNS.get(converter,
+                                                                   u'[^/]*'))
+                    names.append((group, name, converter))
+            patterns.append(u'(%s)(?:/|\\Z)' % u'/'.join(parts))
+            self._groups[outer] = (index, names)
+        self._regex = re.compile(u'|'.join(patterns), re.UNICODE)
 
     def __call__(self, request, segments):
-        match_segments, remaining_segments = \
-                segments[:self._count], segments[self._count:]
+        match_segments = segments[:self._count]
         # Note: no need to use the url module to join the path segments here
         # because we want the unquoted and decoded segments.
-        match_path = '/'.join(match_segments)
+        match_path = u'/'.join(match_segments)
+        # A segment containing a '/' makes the joined path ambiguous, match
+        # each template separately instead.
+        if match_path.count(u'/') != len(match_segments) - 1:
+            return self._match_from(0, request, segments)
         match = self._regex.match(match_path)
-        if not match:
+        if match is None:
             return None
-        return [], match.groupdict(), remaining_segments
+        index, names = self._groups[match.lastindex]
+        kwargs = {}
+        for group, name, converter in names:
+            value = match.group(group)
+            if converter is not None:
+                try:
+                    value = converter(value)
+                except ValueError:
+                    return self._match_from(index + 1, request, segments)
+            kwargs[name] = value
+        matcher, func = self.factories[index]
+        return func, ([], kwargs, segments[matcher._count:])
+
+    def _match_from(self, start, request, segments):
+        """
+        Try each template, from the start'th on, in turn.
+        """
+        for matcher, func in self.factories[start:]:
+            match = matcher(request, segments)
+            if match is not None:
+                return func, match
+        return None
 
 
 class AnyChildMatcher(object):
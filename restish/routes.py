@@ -0,0 +1,128 @@
+"""
+Reverse routing, i.e. building the URLs of resources from the templates that
+locate them.
+
+A Routes instance is told where each resource class is mounted, relative to
+the application's root, and can then build the URL of any of the class's
+template-matched children:
+
+    urls = routes.Routes()
+    urls.mount(Root, '/')
+    urls.mount(Users, '/users')
+    urls.add('news_item', '/news/{id:int}')
+
+    urls.for_(Users.user, id=5)         # -> '/users/5'
+    urls.for_('news_item', id=3)        # -> '/news/3'
+
+Templates are compiled once, when they are added, so building a URL is a
+single string format operation.
+
+Routes bound to a request build URLs below the request's application path,
+which makes them useful as a templating arg:
+
+    args['urls'] = urls.bind(request)
+
+    <a href="{{urls.for_('news_item', id=3)}}">News item #3</a>
+"""
+
+from restish import resource, url
+
+
+class Routes(object):
+    """
+    Registry of named routes and resource class mount points.
+    """
+
+    def __init__(self):
+        # Routes, keyed on name, (class, child factory) or child factory, of
+        # (prefix, TemplateChildMatcher) tuples. A child factory that is
+        # mounted at more than one prefix is ambiguous and maps to None.
+        self._routes = {}
+
+    def add(self, name, template):
+        """
+        Add a named route for the template, relative to the application root.
+        """
+        self._routes[name] = '', _template_matcher(template)
+
+    def mount(self, cls, prefix):
+        """
+        Add routes for the children of a Resource class that is mounted at the
+        prefix, a quoted path relative to the application root.
+
+        The children must be matched by templates, i.e. using @child('...').
+        """
+        prefix = _normalise_prefix(prefix)
+        for matcher, func in cls.child_factories:
+            if not isinstance(matcher, resource.TemplateChildMatcher):
+                continue
+            route = prefix, matcher
+            for key in [(cls, func), func]:
+                if self._routes.get(key, route) != route:
+                    self._routes[key] = None
+                else:
+                    self._routes[key] = route
+
+    def for_(self, target, **kwargs):
+        """
+        Build the URL of a named route, or a mounted class's child (e.g.
+        Users.user), using the kwargs as the values of the template's dynamic
+        segments.
+        """
+        return url.URL(self._path(target, kwargs))
+
+    def bind(self, request):
+        """
+        Return the routes bound to the request, building URLs relative to the
+        request's application path.
+        """
+        return BoundRoutes(self, request)
+
+    def _path(self, target, kwargs):
+        key = getattr(target, 'im_func', None)
+        if key is not None:
+            key = target.im_class, key
+        else:
+            key = target
+        try:
+            route = self._routes[key]
+        except KeyError:
+            raise ValueError('No route for %r' % (target,))
+        if route is None:
+            raise ValueError('Route for %r is ambiguous, use Class.method'
+                             % (target,))
+        prefix, matcher = route
+        return prefix + '/' + matcher.format(**kwargs)
+
+
+class BoundRoutes(object):
+    """
+    Routes bound to a request, see Routes.bind.
+    """
+
+    def __init__(self, routes, request):
+        self.routes = routes
+        self.request = request
+        self._prefix = str(request.application_path).rstrip('/')
+
+    def for_(self, target, **kwargs):
+        """
+        Build the URL, see Routes.for_, relative to the request's
+        application path.
+        """
+        return url.URL(self._prefix + self.routes._path(target, kwargs))
+
+
+def _template_matcher(template):
+    return resource.TemplateChildMatcher(template.strip('/'))
+
+
+def _normalise_prefix(prefix):
+    """
+    Normalise a prefix to a path with a leading '/' but no trailing '/', or ''
+    for the root.
+    """
+    prefix = prefix.strip('/')
+    if prefix:
+        return '/' + prefix
+    return ''
@@ -0,0 +1,172 @@
+"""
+Scheduling of requests by priority class, so that requests for expensive
+resources (e.g. bulk exports) cannot starve cheap or latency-sensitive ones
+(e.g. health checks) of the application's worker threads.
+
+Resources are put in a priority class by name, either for the whole resource
+or for a request method:
+
+    class Export(resource.Resource):
+
+        priority_class = 'bulk'
+
+    class Status(resource.Resource):
+
+        @resource.GET(priority_class='health')
+        def get(self, request):
+            ...
+
+The Scheduler, given to RestishApp, limits how many requests of each class
+are handled at once and, once the application is handling max_concurrency
+requests, starts waiting requests in priority order:
+
+    scheduler = scheduler.Scheduler(limits={'bulk': 2},
+                                    priorities={'health': 10, 'bulk': -10},
+                                    max_concurrency=20, timeout=30)
+    application = app.RestishApp(root, scheduler=scheduler)
+
+Requests for resources without a priority class are in the None class. A
+request that waits longer than the timeout gets a 503 Service Unavailable
+response.
+"""
+
+import itertools
+import threading
+import time
+
+from restish import http
+
+
+# Default for Scheduler.running's name, meaning all priority classes.
+_ALL = object()
+
+
+class Scheduler(object):
+    """
+    Limits the number of requests handled at once, per priority class and in
+    total.
+
+    limits maps priority class names to the maximum number of requests of the
+    class handled at once (unlimited by default). priorities maps class names
+    to priorities (0 by default); higher priority requests are started first.
+    max_concurrency limits the total number of requests handled at once. If
+    timeout (seconds) is not None a request gives up waiting after that long.
+    """
+
+    def __init__(self, limits=None, priorities=None, max_concurrency=None,
+                 timeout=None, timer=time.time):
+        self.limits = dict(limits or {})
+        self.priorities = dict(priorities or {})
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._timer = timer
+        self._condition = threading.Condition()
+        # Number of requests being handled, in total and per class.
+        self._running = 0
+        self._running_classes = {}
+        # Waiting requests, as (-priority, sequence number, class) tickets, in
+        # the order they should be started.
+        self._waiting = []
+        self._sequence = itertools.count()
+
+    def acquire(self, name, timeout=None):
+        """
+        Wait until a request of the named priority class can be started and
+        count it as running.
+
+        Raises http.ServiceUnavailableError if the scheduler's timeout expires
+        first. If timeout (seconds, e.g. until the request's deadline) is not
+        None and expires before the scheduler's timeout, raises
+        http.GatewayTimeoutError instead.
+        """
+        with self._condition:
+            if not self._waiting and self._available(name):
+                self._start(name)
+                return
+            ticket = (-self.priorities.get(name, 0), next(self._sequence), name)
+            self._insert(ticket)
+            error = http.ServiceUnavailableError
+            if timeout is not None and \
+                    (self.timeout is None or timeout < self.timeout):
+                error = http.GatewayTimeoutError
+            else:
+                timeout = self.timeout
+            if timeout is not None:
+                deadline = self._timer() + timeout
+            try:
+                while not self._runnable(ticket):
+                    if timeout is None:
+                        self._condition.wait()
+                        continue
+                    remaining = deadline - self._timer()
+                    if remaining <= 0:
+                        raise error()
+                    self._condition.wait(remaining)
+            finally:
+                self._waiting.remove(ticket)
+                # Whichever way this request stopped waiting, another may now
+                # be first in line.
+                self._condition.notify_all()
+            self._start(name)
+
+    def release(self, name):
+        """
+        Count a request of the named priority class as finished.
+        """
+        with self._condition:
+            self._running -= 1
+            self._running_classes[name] -= 1
+            if self._waiting:
+                self._condition.notify_all()
+
+    def running(self, name=_ALL):
+        """
+        Return the number of requests of the named priority class (None for
+        requests without a class) being handled, or of all classes if no name
+        is given.
+        """
+        with self._condition:
+            if name is _ALL:
+                return self._running
+            return self._running_classes.get(name, 0)
+
+    def waiting(self):
+        """
+        Return the number of requests waiting to start.
+        """
+        with self._condition:
+            return len(self._waiting)
+
+    def _available(self, name):
+        """
+        Test if there is capacity to start a request of the named class.
+        """
+        if self.max_concurrency is not None and \
+                self._running >= self.max_concurrency:
+            return False
+        limit = self.limits.get(name)
+        return limit is None or self._running_classes.get(name, 0) < limit
+
+    def _runnable(self, ticket):
+        """
+        Test if the ticket's request is the first waiting request that can be
+        started.
+        """
+        for waiting in self._waiting:
+            if self._available(waiting[2]):
+                return waiting is ticket
+        return False
+
+    def _insert(self, ticket):
+        """
+        Insert a ticket into the waiting list, in order.
+        """
+        for i, waiting in enumerate(self._waiting):
+            if ticket < waiting:
+                self._waiting.insert(i, ticket)
+                return
+        self._waiting.append(ticket)
+
+    def _start(self, name):
+        self._running += 1
+        self._running_classes[name] = self._running_classes.get(name, 0) + 1
@@ -0,0 +1,73 @@
+import unittest
+
+from restish import admission, http
+
+
+class TestAdmissionController(unittest.TestCase):
+
+    def test_unlimited(self):
+        a = admission.AdmissionController()
+        for i in xrange(10):
+            assert a.enter(http.Request.blank('/')) is None
+        self.assertEquals(a.in_flight, 10)
+
+    def test_max_in_flight(self):
+        a = admission.AdmissionController(max_in_flight=1, retry_after=5)
+        request = http.Request.blank('/')
+        assert a.enter(request) is None
+        response = a.enter(request)
+        assert response.status.startswith('503')
+        self.assertEquals(response.headers['Retry-After'], '5')
+        self.assertEquals(a.in_flight, 1)
+        a.leave()
+        assert a.enter(request) is None
+
+    def test_exempt(self):
+        a = admission.AdmissionController(max_in_flight=1,
+                                          max_queue_latency=1,
+                                          exempt=['health'],
+                                          timer=lambda: 100)
+        request = http.Request.blank('/')
+        assert a.enter(request) is None
+        assert a.enter(request, 'health') is None
+        request.environ['HTTP_X_REQUEST_START'] = 't=10'
+        assert a.enter(request, 'health') is None
+        self.assertEquals(a.in_flight, 3)
+
+    def test_exempt_paths(self):
+        a = admission.AdmissionController(max_in_flight=0,
+                                          exempt_paths=['/health/', '/ping'])
+        for path in ['/health', '/health/db', '/ping']:
+            assert a.enter(http.Request.blank(path)) is None
+        for path in ['/', '/healthy', '/pin']:
+            assert a.enter(http.Request.blank(path)).status.startswith('503')
+        self.assertEquals(a.in_flight, 3)
+
+    def test_queue_latency(self):
+        a = admission.AdmissionController(timer=lambda: 1500000000.5)
+        def check(header, expected):
+            request = http.Request.blank('/')
+            if header is not None:
+                request.environ['HTTP_X_REQUEST_START'] = header
+            self.assertEquals(a.queue_latency(request), expected)
+        check(None, None)
+        check('t=1500000000', 0.5)
+        check('1499999999.5', 1)
+        check('t=1500000000000', 0.5)
+        check('t=1500000000000000', 0.5)
+        check('t=1500000001', 0)
+        check('bad', None)
+
+    def test_max_queue_latency(self):
+        a = admission.AdmissionController(max_queue_latency=1,
+                                          timer=lambda: 100)
+        request = http.Request.blank('/')
+        request.environ['HTTP_X_REQUEST_START'] = 't=99.5'
+        assert a.enter(request) is None
+        request.environ['HTTP_X_REQUEST_START'] = 't=98'
+        assert a.enter(request).status.startswith('503')
+        self.assertEquals(a.in_flight, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,8 @@
 import unittest
 import webtest
 
-from restish import app, http, resource, url
+from restish import admission, app, guard, http, resource, scheduler, url
+from restish.tests import util
 
 
 class Resource(resource.Resource):
@@ -38,6 +39,22 @@ class TestApp(unittest.TestCase):
         A = app.RestishApp(Resource())
         R = webtest.TestApp(A).get('/not_found', status=404)
 
+    def test_locate_not_found(self):
+        A = app.RestishApp(Resource('root'))
+        self.assertRaises(http.NotFoundError, A.locate_resource,
+                          http.Request.blank('/not_found'))
+
+    def test_locate_resource_overridden(self):
+        class App(app.RestishApp):
+            def locate_resource(self, request):
+                try:
+                    return app.RestishApp.locate_resource(self, request)
+                except http.NotFoundError:
+                    return http.ok([('Content-Type', 'text/plain')],
+                                   'not found')
+        A = webtest.TestApp(App(Resource('root')))
+        assert A.get('/not_found', status=200).body == 'not found'
+
     def test_children(self):
         A = app.RestishApp(Resource('root', {'foo': Resource('foo'), 'bar': Resource('bar')}))
         R = webtest.TestApp(A).get('/', status=200)
@@ -116,6 +133,16 @@ class TestApp(unittest.TestCase):
         A = app.RestishApp(Resource())
         R = webtest.TestApp(A).get('/', status=400)
 
+    def test_client_error_body_only(self):
+        class Resource(resource.Resource):
+            def __call__(self, request):
+                raise http.NotFoundError(body='no such user')
+        A = app.RestishApp(Resource())
+        # webtest's lint rejects a response without a Content-Type.
+        R = http.Request.blank('/').get_response(A)
+        assert R.status_int == 404
+        assert R.body == 'no such user'
+
     def test_server_error(self):
         class Resource(resource.Resource):
             def __call__(self, request):
@@ -181,6 +208,191 @@ def resource_func(request):
     return http.ok([('Content-Type', 'text/plain')], 'resource_func')
 
 
+class TestFrozenResponse(unittest.TestCase):
+
+    def test_shared(self):
+        frozen = http.FrozenResponse('200 OK', [], 'frozen')
+        class Resource(resource.Resource):
+            @resource.GET(accept='text/plain')
+            def get(self, request):
+                return frozen
+        A = webtest.TestApp(app.RestishApp(Resource()))
+        R = A.get('/', headers={'Accept': 'text/plain'})
+        assert R.headers['Content-Type'] == 'text/plain'
+        assert R.body == 'frozen'
+        R = A.head('/')
+        assert R.headers['Content-Length'] == '6'
+        assert R.body == ''
+        self.assertEquals(frozen.headerlist, [('Content-Length', '6')])
+
+    def test_head_without_body(self):
+        frozen = http.FrozenResponse('200 OK',
+                                     [('Content-Type', 'text/plain'),
+                                      ('Content-Length', '1234')], None)
+        class Resource(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                return frozen
+        A = webtest.TestApp(app.RestishApp(Resource()))
+        R = A.head('/')
+        self.assertEquals(R.headers['Content-Length'],
+                          frozen.headers['Content-Length'])
+        self.assertEquals(frozen.headerlist,
+                          [('Content-Type', 'text/plain'),
+                           ('Content-Length', '1234')])
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_scheduled(self):
+        class Resource(resource.Resource):
+            priority_class = 'bulk'
+            @resource.GET(priority_class='reads')
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain')],
+                               str(S.running('reads')))
+            @resource.POST()
+            def post(self, request):
+                return http.ok([('Content-Type', 'text/plain')],
+                               str(S.running('bulk')))
+        S = scheduler.Scheduler(limits={'reads': 1, 'bulk': 1}, timeout=0.01)
+        A = webtest.TestApp(app.RestishApp(Resource(), scheduler=S))
+        assert A.get('/').body == '1'
+        assert A.post('/').body == '1'
+        assert S.running() == 0
+        # With the reads class full, GETs and HEADs (answered by the GET
+        # method) wait, and time out, but other requests do not.
+        S.acquire('reads')
+        A.get('/', status=503)
+        A.head('/', status=503)
+        A.post('/', status=200)
+        A.get('/not_found', status=404)
+        S.release('reads')
+        A.get('/', status=200)
+        A.head('/', status=200)
+
+    def test_deadline(self):
+        class Resource(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain')], 'ok')
+        S = scheduler.Scheduler(max_concurrency=1, timeout=60)
+        A = webtest.TestApp(app.RestishApp(Resource(), scheduler=S,
+                                           timeout=0.01))
+        # The request gives up waiting when its deadline passes, long before
+        # the scheduler's timeout.
+        S.acquire(None)
+        A.get('/', status=504)
+        self.assertEquals(S.waiting(), 0)
+        S.release(None)
+        A.get('/', status=200)
+
+
+class TestAdmission(unittest.TestCase):
+
+    def test_admission(self):
+        class Health(resource.Resource):
+            priority_class = 'health'
+            @resource.GET()
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain')], 'ok')
+        class Resource(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain')],
+                               str(A.in_flight))
+            @resource.child()
+            def health(self, request, segments):
+                return Health()
+        A = admission.AdmissionController(max_in_flight=1, exempt=['health'])
+        T = webtest.TestApp(app.RestishApp(Resource(), admission=A))
+        assert T.get('/').body == '1'
+        assert A.in_flight == 0
+        A.enter(http.Request.blank('/'))
+        R = T.get('/', status=503)
+        assert R.headers['Retry-After'] == '1'
+        T.get('/health', status=200)
+        T.get('/not_found', status=404)
+
+    def test_rejected_before_traversal(self):
+        located = []
+        class Child(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain')],
+                               str(A.in_flight))
+        class Resource(resource.Resource):
+            @resource.child()
+            def child(self, request, segments):
+                # The request is in flight while its resource is located.
+                located.append(A.in_flight)
+                return Child()
+        A = admission.AdmissionController(max_in_flight=1,
+                                          exempt_paths=['/health'])
+        T = webtest.TestApp(app.RestishApp(Resource(), admission=A))
+        assert T.get('/child').body == '1'
+        self.assertEquals(located, [1])
+        A.enter(http.Request.blank('/'))
+        T.get('/child', status=503)
+        T.get('/not_found', status=503)
+        self.assertEquals(located, [1])
+        # Exempt paths are located and served as usual.
+        T.get('/health', status=404)
+
+
+class TestDeadline(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = util.Clock(1000.0)
+        self._time = app.time, http.time
+        app.time = http.time = self.clock
+
+    def tearDown(self):
+        app.time, http.time = self._time
+
+    def resource(self, sleep=0):
+        clock = self.clock
+        class Resource(resource.Resource):
+            @resource.child()
+            def slow(self, request, segments):
+                clock.sleep(sleep)
+                return self
+            @resource.GET()
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain')],
+                               repr(request.time_remaining))
+        return Resource()
+
+    def test_timeout(self):
+        A = webtest.TestApp(app.RestishApp(self.resource(), timeout=10))
+        assert A.get('/').body == '10.0'
+        A = webtest.TestApp(app.RestishApp(self.resource(5), timeout=10))
+        assert A.get('/slow').body == '5.0'
+        A.get('/slow/slow', status=504)
+        A.get('/slow/slow/slow', status=504)
+
+    def test_timeout_header(self):
+        A = webtest.TestApp(app.RestishApp(self.resource(), timeout=10,
+                                           timeout_header='X-Request-Timeout'))
+        R = A.get('/', headers={'X-Request-Timeout': '5'})
+        assert R.body == '5.0'
+        R = A.get('/', headers={'X-Request-Timeout': '50'})
+        assert R.body == '10.0'
+        R = A.get('/', headers={'X-Request-Timeout': 'bad'})
+        assert R.body == '10.0'
+        A = webtest.TestApp(app.RestishApp(self.resource(),
+                                           timeout_header='X-Request-Timeout'))
+        R = A.get('/', headers={'X-Request-Timeout': '5'})
+        assert R.body == '5.0'
+        A.get('/', headers={'X-Request-Timeout': '0'}, status=504)
+        assert A.get('/').body == 'None'
+
+    def test_earlier_deadline_kept(self):
+        A = webtest.TestApp(app.RestishApp(self.resource(), timeout=10))
+        R = A.get('/', extra_environ={'restish.deadline': 1005.0})
+        assert R.body == '5.0'
+
+
 class TestResourceLike(unittest.TestCase):
     """
     Test non-Resource subclasses work as expected.
@@ -211,5 +423,152 @@ class TestResourceLike(unittest.TestCase):
         webtest.TestApp(A).get('/foo', status=404)
 
 
+class CountingResource(resource.Resource):
+    """
+    Resource with cacheable and uncacheable children that counts how often
+    each child factory is called.
+    """
+
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    def _child(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        return CountingResource(name, self.calls)
+
+    @resource.child('static', cacheable=True)
+    def static(self, request, segments):
+        return self._child('static')
+
+    @resource.child('{name}', cacheable=True)
+    def named(self, request, segments, name):
+        return self._child(name)
+
+    @resource.child('dynamic')
+    def dynamic(self, request, segments):
+        return self._child('dynamic')
+
+    @resource.child('redirect', cacheable=True)
+    def redirect(self, request, segments):
+        self.calls['redirect'] = self.calls.get('redirect', 0) + 1
+        return http.see_other('/static')
+
+    def __call__(self, request):
+        return http.ok([('Content-Type', 'text/plain')], str(self.name))
+
+
+class TestTraversalCache(unittest.TestCase):
+
+    def test_cached(self):
+        calls = {}
+        A = webtest.TestApp(app.RestishApp(CountingResource('root', calls)))
+        for i in range(2):
+            assert A.get('/static/foo').body == 'foo'
+        assert calls == {'static': 1, 'foo': 1}
+        # Deeper paths continue from the cached resource.
+        assert A.get('/static/foo/bar').body == 'bar'
+        assert calls == {'static': 1, 'foo': 1, 'bar': 1}
+
+    def test_uncacheable_parent(self):
+        calls = {}
+        A = webtest.TestApp(app.RestishApp(CountingResource('root', calls)))
+        for i in range(2):
+            assert A.get('/dynamic/foo').body == 'foo'
+        assert calls == {'dynamic': 2, 'foo': 2}
+        # Cacheable children before the uncacheable one are still cached.
+        for i in range(2):
+            assert A.get('/static/dynamic').body == 'dynamic'
+        assert calls == {'static': 1, 'dynamic': 4, 'foo': 2}
+
+    def test_response_not_cached(self):
+        calls = {}
+        A = webtest.TestApp(app.RestishApp(CountingResource('root', calls)))
+        for i in range(2):
+            A.get('/redirect', status=303)
+        assert calls == {'redirect': 2}
+
+    def test_guarded(self):
+        checks = []
+        def checker(request, obj):
+            checks.append(request.path_info)
+        calls = {}
+        root = guard.GuardResource(CountingResource('root', calls), checker)
+        A = webtest.TestApp(app.RestishApp(root))
+        for i in range(2):
+            assert A.get('/static').body == 'static'
+        assert calls == {'static': 2}
+        assert checks == ['/static', '/static']
+
+    def test_disabled(self):
+        calls = {}
+        A = webtest.TestApp(app.RestishApp(CountingResource('root', calls),
+                                           traversal_cache_size=0))
+        for i in range(2):
+            assert A.get('/static').body == 'static'
+        assert calls == {'static': 2}
+
+
+def echo_app(name):
+    """
+    Create a WSGI application that responds with its name, SCRIPT_NAME and
+    PATH_INFO.
+    """
+    def application(environ, start_response):
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return ['%s %s %s' % (name, environ['SCRIPT_NAME'],
+                              environ['PATH_INFO'])]
+    return application
+
+
+class TestMountApp(unittest.TestCase):
+
+    def test_prefix(self):
+        M = app.MountApp()
+        M.mount('/', echo_app('root'))
+        M.mount('/a', echo_app('a'))
+        M.mount('/a/b/', echo_app('ab'))
+        A = webtest.TestApp(M)
+        assert A.get('/').body == 'root  /'
+        assert A.get('/x').body == 'root  /x'
+        assert A.get('/a').body == 'a /a '
+        assert A.get('/a/').body == 'a /a /'
+        assert A.get('/ab').body == 'root  /ab'
+        assert A.get('/a/x/y').body == 'a /a /x/y'
+        assert A.get('/a/b/c').body == 'ab /a/b /c'
+
+    def test_not_found(self):
+        M = app.MountApp()
+        M.mount('/a', echo_app('a'))
+        webtest.TestApp(M).get('/b', status=404)
+
+    def test_host(self):
+        M = app.MountApp()
+        M.mount('/', echo_app('any'))
+        M.mount('/a', echo_app('any-a'))
+        M.mount('/', echo_app('example'), host='Example.com')
+        A = webtest.TestApp(M)
+        assert A.get('/a', headers={'Host': 'example.com:8080'}).body == \
+                'example  /a'
+        assert A.get('/a', headers={'Host': 'other.com'}).body == \
+                'any-a /a '
+        assert A.get('/', headers={'Host': 'other.com'}).body == 'any  /'
+
+    def test_host_only(self):
+        M = app.MountApp()
+        M.mount('/', echo_app('example'), host='example.com')
+        A = webtest.TestApp(M)
+        assert A.get('/', headers={'Host': 'example.com'}).body == \
+                'example  /'
+        A.get('/', headers={'Host': 'other.com'}, status=404)
+
+    def test_resource(self):
+        M = app.MountApp()
+        M.mount('/foo', Resource('root', {'bar': Resource('bar')}))
+        A = webtest.TestApp(M)
+        assert A.get('/foo').body == 'root'
+        assert A.get('/foo/bar').body == 'bar'
+
+
 if __name__ == '__main__':
     unittest.main()
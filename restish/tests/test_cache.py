@@ -0,0 +1,100 @@
+import unittest
+
+from restish import cache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_set(self):
+        c = cache.LRUCache(10)
+        assert c.get('a') is None
+        assert c.get('a', 'default') == 'default'
+        c.set('a', 1)
+        assert c.get('a') == 1
+        assert 'a' in c
+        assert len(c) == 1
+        c.set('a', 2)
+        assert c.get('a') == 2
+        assert len(c) == 1
+
+    def test_eviction(self):
+        c = cache.LRUCache(2)
+        c.set('a', 1)
+        c.set('b', 2)
+        c.set('c', 3)
+        assert 'a' not in c
+        assert c.get('b') == 2
+        assert c.get('c') == 3
+
+    def test_eviction_order(self):
+        c = cache.LRUCache(2)
+        c.set('a', 1)
+        c.set('b', 2)
+        # Using 'a' makes 'b' the least recently used.
+        c.get('a')
+        c.set('c', 3)
+        assert c.get('a') == 1
+        assert 'b' not in c
+
+    def test_zero_size(self):
+        c = cache.LRUCache(0)
+        c.set('a', 1)
+        assert 'a' not in c
+
+    def test_pop(self):
+        c = cache.LRUCache(2)
+        c.set('a', 1)
+        c.set('b', 2)
+        assert c.pop('a') == 1
+        assert c.pop('a') is None
+        c.set('c', 3)
+        c.set('d', 4)
+        assert len(c) == 2
+        assert 'b' not in c
+
+    def test_keys(self):
+        c = cache.LRUCache(2)
+        c.set('a', 1)
+        c.set('b', 2)
+        self.assertEquals(sorted(c.keys()), ['a', 'b'])
+
+    def test_clear(self):
+        c = cache.LRUCache(2)
+        c.set('a', 1)
+        c.clear()
+        assert len(c) == 0
+        c.set('b', 2)
+        assert c.get('b') == 2
+
+
+class TestTTLCache(unittest.TestCase):
+
+    def test_expiry(self):
+        now = [0]
+        c = cache.TTLCache(10, 5, timer=lambda: now[0])
+        c.set('a', 1)
+        assert c.get('a') == 1
+        assert 'a' in c
+        now[0] = 4
+        assert c.get('a') == 1
+        now[0] = 5
+        assert c.get('a') is None
+        assert 'a' not in c
+        assert len(c) == 0
+
+    def test_pop(self):
+        c = cache.TTLCache(10, 5)
+        c.set('a', 1)
+        assert c.pop('a') == 1
+        assert c.pop('a', 'default') == 'default'
+
+    def test_eviction(self):
+        c = cache.TTLCache(1, 5)
+        c.set('a', 1)
+        c.set('b', 2)
+        assert 'a' not in c
+        assert c.get('b') == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
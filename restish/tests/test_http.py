@@ -3,6 +3,7 @@ import unittest
 import webtest
 
 from restish import app, http, url
+from restish.tests import util
 
 
 def make_environ(path='/bar', base_url='http://localhost:1234/foo', **k):
@@ -18,6 +19,17 @@ class TestRequestCreation(unittest.TestCase):
     def test_blank(self):
         assert isinstance(http.Request.blank('/'), http.Request)
 
+    def test_init_not_dict(self):
+        self.assertRaises(TypeError, http.Request, None)
+
+    def test_environ_only(self):
+        # A request's state is kept in its environ.
+        r = http.Request(http.Request.blank('/').environ)
+        r.method = 'POST'
+        r.foo = 'bar'
+        r = http.Request(r.environ)
+        self.assertEquals((r.method, r.foo), ('POST', 'bar'))
+
 
 class TestRequestAttributes(unittest.TestCase):
 
@@ -43,6 +55,64 @@ class TestRequestAttributes(unittest.TestCase):
         r = http.Request.blank('/', base_url='/foo/')
         self.assertEquals(r.application_path, '/foo/')
 
+    def test_url_properties_cached(self):
+        r = http.Request.blank('/a/b?c=d', base_url='http://localhost/foo')
+        for name in ['host_url', 'application_url', 'application_path',
+                     'path_url', 'url', 'path', 'path_qs']:
+            assert getattr(r, name) is getattr(r, name)
+        # Another request for the same environ uses the same cache.
+        assert http.Request(r.environ).url is r.url
+
+    def test_url_properties_invalidated(self):
+        r = http.Request.blank('/a/b?c=d', base_url='http://localhost/foo')
+        self.assertEquals(r.url, 'http://localhost/foo/a/b?c=d')
+        self.assertEquals(r.application_path, '/foo')
+        r.environ['SCRIPT_NAME'] = '/foo/a'
+        r.environ['PATH_INFO'] = '/b'
+        self.assertEquals(r.url, 'http://localhost/foo/a/b?c=d')
+        self.assertEquals(r.application_path, '/foo/a')
+        self.assertEquals(r.path_url, 'http://localhost/foo/a/b')
+        r.environ['QUERY_STRING'] = 'e=f'
+        self.assertEquals(r.path_qs, '/foo/a/b?e=f')
+        r.environ['HTTP_HOST'] = 'example.com:8080'
+        self.assertEquals(r.host_url, 'http://example.com:8080')
+
+    def test_query_dict(self):
+        r = http.Request.blank('/?a=1&b=2&a=3')
+        self.assertEquals(r.query_dict.items(),
+                          [('a', '1'), ('b', '2'), ('a', '3')])
+        assert r.query_dict is r.query_dict
+        r.environ['QUERY_STRING'] = 'c'
+        self.assertEquals(r.query_dict.items(), [('c', None)])
+
+    def test_deadline(self):
+        clock = util.Clock(1000.0)
+        self.addCleanup(setattr, http, 'time', http.time)
+        http.time = clock
+        r = http.Request.blank('/')
+        assert r.deadline is None
+        assert r.time_remaining is None
+        r.check_deadline()
+        r.deadline = 1060.0
+        assert r.environ['restish.deadline'] == 1060.0
+        self.assertEquals(r.time_remaining, 60)
+        r.check_deadline()
+        clock.sleep(61)
+        self.assertEquals(r.time_remaining, -1)
+        self.assertRaises(http.GatewayTimeoutError, r.check_deadline)
+        r.deadline = None
+        assert 'restish.deadline' not in r.environ
+
+    def test_path_info_segments(self):
+        r = http.Request.blank('/a/b', base_url='/foo')
+        self.assertEquals(r.path_info_segments, ['a', 'b'])
+        r.path_info_segments.append('c')
+        self.assertEquals(r.path_info_segments, ['a', 'b'])
+        r.environ['PATH_INFO'] = '/c'
+        self.assertEquals(r.path_info_segments, ['c'])
+        r = http.Request.blank('/%E0')
+        self.assertRaises(UnicodeDecodeError, lambda: r.path_info_segments)
+
 
 class TestResponseCreation(unittest.TestCase):
 
@@ -57,6 +127,11 @@ class TestResponseCreation(unittest.TestCase):
     def test_init_with_none(self):
         return http.Response('200 OK', [], None)
 
+    def test_init_with_none_headers(self):
+        r = http.Response('200 OK', None, 'x')
+        assert r.wsgi_response() == ('200 OK', [('Content-Length', '1')], ['x'])
+        assert r.body == 'x'
+
     def test_init_with_none_maintains_content_length(self):
         response = http.Response('200 OK', [('Content-Length', 10)], None)
         assert response.headers['Content-Length'] == 10
@@ -65,6 +140,98 @@ class TestResponseCreation(unittest.TestCase):
         r = http.Response('200 OK', [], None)
         assert r.headers == {'Content-Length': '0'}
 
+    def test_lazy_webob(self):
+        r = http.Response('200 OK', [('Content-Type', 'text/plain')], 'bytes')
+        assert '_raw' in r.__dict__
+        self.assertEquals(r.wsgi_response(),
+                          ('200 OK', [('Content-Type', 'text/plain'),
+                                      ('Content-Length', '5')], ['bytes']))
+        assert '_raw' in r.__dict__
+        self.assertEquals(r.status_int, 200)
+        assert '_raw' not in r.__dict__
+
+    def test_set_before_get(self):
+        r = http.Response('200 OK', [], 'bytes')
+        r.status = '404 Not Found'
+        r.headers['X-Foo'] = 'bar'
+        status, headers, app_iter = r.wsgi_response()
+        self.assertEquals(status, '404 Not Found')
+        assert ('X-Foo', 'bar') in headers
+        self.assertEquals(app_iter, ['bytes'])
+
+    def test_canned(self):
+        canned = http.CannedResponse('200 OK', [('Content-Type', 'text/plain')],
+                                     'bytes')
+        expected = ('200 OK', [('Content-Type', 'text/plain'),
+                               ('Content-Length', '5')], ['bytes'])
+        self.assertEquals(canned().wsgi_response(), expected)
+        r = canned()
+        self.assertEquals(r.status, '200 OK')
+        self.assertEquals(r.body, 'bytes')
+        r.headers['X-Foo'] = 'bar'
+        r.body = 'changed'
+        self.assertEquals(r.wsgi_response()[2], ['changed'])
+        self.assertEquals(canned().wsgi_response(), expected)
+
+    def test_canned_errors(self):
+        r = http.not_found()
+        r.headers['Content-Type'] = 'text/html'
+        self.assertEquals(http.not_found().headers['Content-Type'], 'text/plain')
+        r = http.method_not_allowed('GET')
+        r.headers['Allow'] = 'POST'
+        self.assertEquals(http.method_not_allowed(['GET']).headers['Allow'],
+                          'GET')
+
+    def test_frozen(self):
+        r = http.FrozenResponse('200 OK', [('Content-Type', 'text/plain')],
+                                'bytes')
+        expected = ('200 OK', [('Content-Type', 'text/plain'),
+                               ('Content-Length', '5')], ('bytes',))
+        self.assertEquals(r.wsgi_response(), expected)
+        self.assertEquals(r.status_int, 200)
+        self.assertEquals(r.headers['Content-Length'], '5')
+        self.assertEquals(r.body, 'bytes')
+        self.assertRaises(TypeError, setattr, r, 'body', 'changed')
+        self.assertRaises(TypeError, r.headers.__setitem__, 'X-Foo', 'bar')
+        self.assertRaises(TypeError, r.headerlist.append, ('X-Foo', 'bar'))
+        self.assertEquals(r.wsgi_response(), expected)
+
+    def test_frozen_copy(self):
+        r = http.FrozenResponse('200 OK', [], 'bytes')
+        copy = r.copy()
+        assert not isinstance(copy, http.FrozenResponse)
+        copy.body = 'changed'
+        self.assertEquals(copy.body, 'changed')
+        self.assertEquals(r.body, 'bytes')
+        r = http.FrozenResponse('200 OK', [('Content-Length', '10')], None)
+        status, headers, app_iter = r.copy().wsgi_response()
+        self.assertEquals((status, headers, list(app_iter)),
+                          ('200 OK', [('Content-Length', '10')], ['']))
+
+    def test_frozen_body(self):
+        self.assertEquals(
+            http.FrozenResponse('204 No Content', [], None).wsgi_response(),
+            ('204 No Content', [('Content-Length', '0')], ('',)))
+        self.assertRaises(TypeError, http.FrozenResponse, '200 OK', [],
+                          iter(['bytes']))
+
+    def test_wsgi_response_matches_webob(self):
+        def webob_response(status, headers, body):
+            r = http.Response(status, headers, body)
+            r._init_webob()
+            return r.status, r.headerlist, r.app_iter
+        body = ['a', 'b']
+        for args in [('200 OK', [('Content-Type', 'text/plain')], 'bytes'),
+                     ('200 OK', [('Content-Length', '1')], 'bytes'),
+                     ('200 OK', [('Content-Length', '10'),
+                                 ('Content-Type', 'text/plain')], None),
+                     ('204 No Content', [], None),
+                     ('200 OK', [('content-length', '2')], body),
+                     ('200 OK', [], body),
+                     ('200', [], 'bytes')]:
+            self.assertEquals(http.Response(*args).wsgi_response(),
+                              webob_response(*args))
+
 
 class TestSuccessResponseFactories(unittest.TestCase):
 
@@ -209,6 +376,14 @@ class TestClientErrorResponseFactories(unittest.TestCase):
         r = exc.make_response()
         assert r.status.startswith('404')
 
+    def test_body_only(self):
+        r = http.not_found(None, 'gone')
+        assert r.status.startswith('404')
+        assert r.body == 'gone'
+        r = http.NotFoundError(body='no such user').make_response()
+        assert r.status.startswith('404')
+        assert r.body == 'no such user'
+
     def test_method_not_allowed(self):
         r = http.method_not_allowed('GET, POST')
         assert r.status.startswith('405')
@@ -266,6 +441,13 @@ class TestServerErrorResponseFactories(unittest.TestCase):
             assert r1.headers['Content-Type'] == r2.headers['Content-Type'] == 'text/plain'
             assert status in r1.body and status in r2.body
 
+    def test_body_only(self):
+        for func, exc_cls, a, k, status in self.tests:
+            r1 = func(body='body')
+            r2 = exc_cls(body='body').make_response()
+            assert r1.status.startswith(status) and r2.status.startswith(status)
+            assert r1.body == r2.body == 'body'
+
 
 if __name__ == '__main__':
     unittest.main()
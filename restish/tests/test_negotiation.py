@@ -0,0 +1,86 @@
+import unittest
+
+from restish import negotiation
+
+
+def best_match(supported, header):
+    """
+    Return the supported media type string that best matches the header, or
+    None.
+    """
+    parsed = [negotiation.parse_media_type(t) for t in supported]
+    best = negotiation.best_match(parsed,
+                                  negotiation.parse_media_ranges(header))
+    if best is None:
+        return None
+    return supported[best]
+
+
+class TestParse(unittest.TestCase):
+
+    def test_media_type(self):
+        self.assertEquals(negotiation.parse_media_type('text/html'),
+                          ('text', 'html', ()))
+        self.assertEquals(negotiation.parse_media_type('Text/HTML; level=1'),
+                          ('text', 'html', (('level', '1'),)))
+        self.assertEquals(negotiation.parse_media_type('*'), ('*', '*', ()))
+
+    def test_invalid_media_type(self):
+        assert negotiation.parse_media_type('unknown') is None
+        assert negotiation.parse_media_type('a/b/c') is None
+        assert negotiation.parse_media_type('/html') is None
+
+    def test_media_ranges(self):
+        self.assertEquals(
+            negotiation.parse_media_ranges('text/html;q=0.5, */*; q=0.1'),
+            [('text', 'html', (), 0.5), ('*', '*', (), 0.1)])
+
+    def test_malformed_media_ranges(self):
+        self.assertEquals(negotiation.parse_media_ranges(''), [])
+        self.assertEquals(
+            negotiation.parse_media_ranges('foo, text/html;, text/plain;q=x,'),
+            [('text', 'html', (), 1.0), ('text', 'plain', (), 1.0)])
+        self.assertEquals(negotiation.parse_media_ranges('text/html;q=2'),
+                          [('text', 'html', (), 1.0)])
+
+
+class TestBestMatch(unittest.TestCase):
+
+    def test_exact(self):
+        assert best_match(['text/html', 'application/json'],
+                          'application/json') == 'application/json'
+
+    def test_no_match(self):
+        assert best_match(['text/html'], 'application/json') is None
+
+    def test_wildcards(self):
+        assert best_match(['application/xbel+xml', 'text/xml'],
+                          'text/*;q=0.5,*/*; q=0.1') == 'text/xml'
+        assert best_match(['text/*'], 'text/plain') == 'text/*'
+        assert best_match(['*/*', 'text/*'], 'text/plain') == 'text/*'
+
+    def test_quality(self):
+        assert best_match(['text/html', 'text/plain'],
+                          'text/html;q=0.9, text/plain') == 'text/plain'
+        assert best_match(['text/html', 'text/plain'],
+                          'text/html;q=0.5, text/plain;q=0.4') == 'text/html'
+
+    def test_first_wins(self):
+        assert best_match(['text/html', 'application/xhtml+xml'],
+                          'application/xhtml+xml, text/html') == 'text/html'
+
+    def test_params(self):
+        assert best_match(['text/html;level=1', 'text/html;level=2'],
+                          'text/html;level=2') == 'text/html;level=2'
+
+    def test_not_acceptable(self):
+        assert best_match(['text/html'], 'text/html;q=0, */*') is None
+        assert best_match(['text/html', 'application/json'],
+                          'text/html;q=0, */*') == 'application/json'
+
+    def test_invalid_supported(self):
+        assert best_match(['unknown', 'text/html'], '*/*') == 'text/html'
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import threading
+import unittest
+import webtest
+
+from restish import app, http, offload, resource
+from restish.tests import util
+
+
+# Set to let blocked PUT requests finish. Created before any worker process
+# is started, so that the worker processes inherit it.
+release = multiprocessing.Event()
+
+
+class Resource(resource.Resource):
+
+    @resource.GET(offload='process')
+    def get(self, request):
+        return http.ok([('Content-Type', 'text/plain')], str(os.getpid()))
+
+    @resource.POST(offload='process')
+    def post(self, request):
+        body = '%s: %s' % (request.query_dict['a'], request.body)
+        return http.ok([('Content-Type', 'text/plain')], str(body))
+
+    @resource.PUT(offload='process')
+    def put(self, request):
+        release.wait(60)
+        return http.ok([('Content-Type', 'text/plain')], 'done')
+
+    @resource.DELETE(offload='process')
+    def delete(self, request):
+        raise ValueError('error in worker')
+
+
+class TestOffload(unittest.TestCase):
+
+    def setUp(self):
+        release.clear()
+        offload.configure(processes=1, max_pending=1)
+        self.app = webtest.TestApp(app.RestishApp(Resource()))
+
+    def tearDown(self):
+        release.set()
+        offload.get_pool().close()
+
+    def test_offloaded(self):
+        R = self.app.get('/')
+        assert R.body != str(os.getpid())
+        R = self.app.post('/?a=1', 'body')
+        self.assertEquals(R.body, '1: body')
+
+    def test_error(self):
+        self.assertRaises(ValueError, self.app.delete, '/')
+        # The failed call is no longer pending.
+        self.app.get('/', status=200)
+
+    def test_full(self):
+        offload.configure(processes=1, max_pending=0)
+        self.app.get('/', status=503)
+
+    def test_deadline(self):
+        # Fix the clock that deadlines are checked against, so the request
+        # only times out waiting for the worker process.
+        self.addCleanup(setattr, app, 'time', app.time)
+        self.addCleanup(setattr, http, 'time', http.time)
+        app.time = http.time = util.Clock(1000.0)
+        A = webtest.TestApp(app.RestishApp(Resource(), timeout=0.1))
+        A.put('/', '', status=504)
+        # The timed out request is still running, so there is no room for
+        # another.
+        A.get('/', status=503)
+        A.put('/', '', status=503)
+        # Once it has finished there is.
+        release.set()
+        pool = offload.get_pool()
+        pool.close()
+        self.assertEquals(pool.pending(), 0)
+
+    def test_closed(self):
+        offload.get_pool().close()
+        self.app.get('/', status=503)
+
+    def test_not_configured(self):
+        pool, offload._pool = offload._pool, None
+        try:
+            self.assertRaises(TypeError, self.app.get, '/')
+        finally:
+            offload._pool = pool
+
+    def test_unpicklable(self):
+        self.assertRaises(TypeError, offload.get_pool().call, len,
+                          (threading.Lock(),))
+        self.app.get('/', status=200)
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, resource.GET, offload='thread')
+
+
+if __name__ == '__main__':
+    unittest.main()
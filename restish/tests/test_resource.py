@@ -60,6 +60,35 @@ class TestResourceMetaclass(unittest.TestCase):
         assert len(Derived1.request_dispatchers['POST']) == 1
         assert len(Derived2.request_dispatchers['POST']) == 2
 
+    def test_priority_class(self):
+        class Base(resource.Resource):
+            priority_class = 'base'
+            @resource.GET(priority_class='reads')
+            def get(self, request):
+                pass
+            @resource.POST(accept='json', priority_class='json')
+            def post_json(self, request):
+                pass
+            @resource.POST(accept='csv')
+            def post_csv(self, request):
+                pass
+        class Derived(Base):
+            priority_class = 'derived'
+            @resource.GET(accept='csv', priority_class='reads')
+            def get_csv(self, request):
+                pass
+        def check(resource_, method, expected):
+            self.assertEquals(resource.priority_class(resource_, method),
+                              expected)
+        check(Base(), 'GET', 'reads')
+        check(Base(), 'HEAD', 'reads')
+        check(Base(), 'POST', 'base')
+        check(Derived(), 'GET', 'reads')
+        check(Derived(), 'POST', 'derived')
+        check(resource.GET(priority_class='func')(lambda request: None),
+              'GET', 'func')
+        check(lambda request: None, 'GET', None)
+
     def test_leaking_child_factories(self):
         # Check that child factories from a resource class do not leak into a
         # sibling class.
@@ -88,12 +117,61 @@ class TestResourceMetaclass(unittest.TestCase):
             pass
         assert len(Derived.request_dispatchers['GET']) == 1
 
+    def test_wildcard_dispatchers(self):
+        # Check only methods with a single catch-all dispatcher skip
+        # negotiation.
+        class Base(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                pass
+            @resource.POST(content_type='json')
+            def post(self, request):
+                pass
+        class Derived(Base):
+            @resource.GET(accept='json')
+            def json(self, request):
+                pass
+        assert sorted(Base._wildcard_dispatchers) == ['GET', 'HEAD']
+        assert sorted(Derived._wildcard_dispatchers) == ['HEAD']
+
 
 class TestResource(unittest.TestCase):
 
     def test_no_method_handler(self):
         make_app(resource.Resource()).get('/', status=405)
 
+    def test_allow(self):
+        class Resource(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                pass
+            @resource.POST()
+            def post(self, request):
+                pass
+        response = make_app(Resource()).put('/', status=405)
+        assert sorted(response.headers['Allow'].split(', ')) == \
+                ['GET', 'HEAD', 'POST']
+
+    def test_wildcard_dispatch(self):
+        # Check a request that has nothing to negotiate goes straight to the
+        # dispatcher.
+        class Resource(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain')], 'GET')
+        app = make_app(Resource())
+        negotiate = resource._negotiate
+        def fail(owner, dispatchers, request):
+            self.fail('Request was negotiated.')
+        resource._negotiate = fail
+        try:
+            response = app.get('/')
+            response = app.head('/')
+        finally:
+            resource._negotiate = negotiate
+        assert response.headers['Content-Type'] == 'text/plain'
+        app.get('/', headers={'Accept': 'text/plain'})
+
     def test_methods(self):
         class Resource(resource.Resource):
             @resource.GET()
@@ -327,6 +405,213 @@ class TestChildLookup(unittest.TestCase):
         assert R.status.startswith('200')
         assert R.body == "['users', u'foo'] {'username': u'foo'}"
 
+    def test_typed_match(self):
+        class Resource(resource.Resource):
+            def __init__(self, args=None):
+                self.args = args
+            @resource.child('users/{id:int}')
+            def user(self, request, segments, id):
+                return self.__class__({'id': id})
+            @resource.child('users/{key:uuid}')
+            def user_by_key(self, request, segments, key):
+                return self.__class__({'key': key})
+            @resource.child('users/{name:str}')
+            def user_by_name(self, request, segments, name):
+                return self.__class__({'name': name})
+            def __call__(self, request):
+                return http.ok([('Content-Type', 'text/plain')], repr(self.args))
+        A = app.RestishApp(Resource())
+        R = webtest.TestApp(A).get('/users/5')
+        assert R.body == "{'id': 5}"
+        R = webtest.TestApp(A).get('/users/12345678-1234-5678-1234-567812345678')
+        assert R.body == "{'key': UUID('12345678-1234-5678-1234-567812345678')}"
+        R = webtest.TestApp(A).get('/users/foo')
+        assert R.body == "{'name': u'foo'}"
+
+    def test_typed_match_failure(self):
+        class Resource(resource.Resource):
+            @resource.child('{id:int}')
+            def user(self, request, segments, id):
+                return http.ok([('Content-Type', 'text/plain')], repr(id))
+        A = app.RestishApp(Resource())
+        assert webtest.TestApp(A).get('/42').body == '42'
+        webtest.TestApp(A).get('/-42', status=404)
+        webtest.TestApp(A).get('/foo', status=404)
+        # Only ASCII digits, not e.g. Arabic-Indic or fullwidth ones.
+        webtest.TestApp(A).get('/%D9%A3', status=404)
+        webtest.TestApp(A).get('/%EF%BC%93', status=404)
+        assert resource._convert_int(u'3') == 3
+        self.assertRaises(ValueError, resource._convert_int, u'\u0663')
+
+    def test_many_pattern_children(self):
+        def factory(i):
+            def child(self, request, segments, **kwargs):
+                return http.ok([('Content-Type', 'text/plain')],
+                               '%d %s' % (i, sorted(kwargs.values())))
+            template = '/'.join(['{a%d}' % j for j in range(i + 1)])
+            return resource.child(template)(child)
+        attrs = dict(('child%d' % i, factory(i)) for i in range(60))
+        Resource = type('Resource', (resource.Resource,), attrs)
+        A = app.RestishApp(Resource())
+        for i in [0, 1, 30, 59]:
+            path = '/'.join(['x'] * (i + 1))
+            R = webtest.TestApp(A).get('/' + path)
+            assert R.body == '%d %s' % (i, [u'x'] * (i + 1))
+
+    def test_pattern_segment_with_slash(self):
+        class Resource(resource.Resource):
+            @resource.child('{a}/{b}/{c}')
+            def three(self, request, segments, **kwargs):
+                return http.ok([('Content-Type', 'text/plain')], 'three')
+            @resource.child('{a}/c')
+            def two(self, request, segments, a):
+                return http.ok([('Content-Type', 'text/plain')], a.encode('utf-8'))
+        A = app.RestishApp(Resource())
+        assert webtest.TestApp(A).get('/x/y/z').body == 'three'
+        assert webtest.TestApp(A).get('/a%252Fb/c').body == 'a/b'
+
+    def test_unknown_converter(self):
+        self.assertRaises(ValueError, resource.TemplateChildMatcher, '{id:float}')
+
+    def test_shared(self):
+        class Resource(resource.Resource):
+            @resource.child('users/{id:int}', shared=True)
+            def user(self, request, segments, id):
+                return Resource()
+            @resource.child('tagged/{tag}', shared=True)
+            def tagged(self, request, segments, tag):
+                return Resource(), []
+            @resource.child('new/{tag}')
+            def new(self, request, segments, tag):
+                return Resource()
+        def child(path):
+            request = http.Request.blank('/' + path)
+            return Resource().resource_child(request, path.split('/'))[0]
+        assert child('users/1') is child('users/1')
+        assert child('users/1') is not child('users/2')
+        assert child('new/1') is not child('new/1')
+        # Children returned with their remaining segments aren't shared.
+        assert child('tagged/1') is not child('tagged/1')
+
+    def test_shared_per_parent(self):
+        class User(resource.Resource):
+            def __init__(self, org, id):
+                self.org, self.id = org, id
+        class Org(resource.Resource):
+            def __init__(self, id):
+                self.id = id
+            @resource.child('users/{id:int}', shared=True)
+            def user(self, request, segments, id):
+                return User(self.id, id)
+        class SubOrg(Org):
+            pass
+        class Root(resource.Resource):
+            @resource.child('orgs/{id:int}')
+            def org(self, request, segments, id):
+                return Org(id)
+            @resource.child('suborgs/{id:int}')
+            def suborg(self, request, segments, id):
+                return SubOrg(id)
+        A = app.RestishApp(Root())
+        def child(path):
+            request = http.Request.blank(path)
+            return A.locate_resource(request)
+        a = child('/orgs/1/users/5')
+        self.assertEquals((a.org, a.id), (1, 5))
+        assert child('/orgs/1/users/5') is a
+        b = child('/orgs/2/users/5')
+        self.assertEquals((b.org, b.id), (2, 5))
+        c = child('/suborgs/1/users/5')
+        assert c is not a
+        # Without a known parent path the child is not shared.
+        request = http.Request.blank('/other')
+        assert Org(1).resource_child(request, ['users', '5'])[0] is not \
+                Org(1).resource_child(request, ['users', '5'])[0]
+
+    def test_negative_cache(self):
+        users = {1: 'one'}
+        calls = []
+        missing = resource.NegativeCache()
+        class Resource(resource.Resource):
+            def __init__(self, name=None):
+                self.name = name
+            @resource.child('users/{id:int}', negative_cache=missing)
+            def user(self, request, segments, id):
+                calls.append(id)
+                if id in users:
+                    return Resource(users[id])
+        def child(path):
+            request = http.Request.blank('/' + path)
+            return Resource().resource_child(request, path.split('/'))
+        assert child('users/1')[0].name == 'one'
+        assert child('users/1')[0].name == 'one'
+        assert child('users/2') is None
+        assert child('users/2') is None
+        assert calls == [1, 1, 2]
+        # The child is looked up again once the cache is invalidated.
+        users[2] = 'two'
+        missing.invalidate(id=2)
+        assert child('users/2')[0].name == 'two'
+        assert calls == [1, 1, 2, 2]
+
+    def test_negative_cache_default(self):
+        calls = []
+        class Resource(resource.Resource):
+            @resource.child('{name}', negative_cache=True)
+            def named(self, request, segments, name):
+                calls.append(name)
+        request = http.Request.blank('/a')
+        for i in range(2):
+            assert Resource().resource_child(request, ['a']) is None
+        assert calls == ['a']
+
+    def test_negative_cache_per_parent(self):
+        users = {1: [], 2: [5]}
+        calls = []
+        class User(resource.Resource):
+            pass
+        class Org(resource.Resource):
+            def __init__(self, id):
+                self.id = id
+            @resource.child('users/{id:int}', negative_cache=True)
+            def user(self, request, segments, id):
+                calls.append((self.id, id))
+                if id in users[self.id]:
+                    return User()
+        class SubOrg(Org):
+            pass
+        class Root(resource.Resource):
+            @resource.child('orgs/{id:int}')
+            def org(self, request, segments, id):
+                return Org(id)
+            @resource.child('suborgs/{id:int}')
+            def suborg(self, request, segments, id):
+                return SubOrg(id)
+        A = webtest.TestApp(app.RestishApp(Root()))
+        for i in range(2):
+            A.get('/orgs/1/users/5', status=404)
+            A.get('/orgs/2/users/5', status=405)
+            A.get('/suborgs/2/users/5', status=405)
+        self.assertEquals(calls, [(1, 5), (2, 5), (2, 5), (2, 5), (2, 5)])
+        # A parent whose path is not known is not cached.
+        request = http.Request.blank('/other')
+        for i in range(2):
+            assert Org(1).resource_child(request, ['users', '5']) is None
+        self.assertEquals(calls[-2:], [(1, 5), (1, 5)])
+
+    def test_shared_maxsize(self):
+        class Resource(resource.Resource):
+            @resource.child('{name}', shared=1)
+            def named(self, request, segments, name):
+                return Resource()
+        def child(name):
+            request = http.Request.blank('/' + name)
+            return Resource().resource_child(request, [name])[0]
+        a = child('a')
+        assert child('a') is a
+        child('b')
+        assert child('a') is not a
+
     def test_any_match(self):
         class Resource(resource.Resource):
             def __init__(self, segments=[]):
@@ -433,6 +718,48 @@ class TestChildLookup(unittest.TestCase):
         R = webtest.TestApp(A).get('/foo')
         assert R.body == 'foobar'
 
+    def test_many_literal_children(self):
+        names = ['child%d' % i for i in range(50)]
+        def factory(name):
+            def child(self, request, segments):
+                return http.ok([('Content-Type', 'text/plain')], name)
+            return resource.child(name)(child)
+        attrs = dict((name, factory(name)) for name in names)
+        Resource = type('Resource', (resource.Resource,), attrs)
+        A = app.RestishApp(Resource())
+        for name in names:
+            R = webtest.TestApp(A).get('/' + name)
+            assert R.body == name
+        webtest.TestApp(A).get('/child50', status=404)
+
+    def test_literal_index_keeps_score_order(self):
+        """
+        Check that indexing children by their literal first segment does not
+        change which child wins.
+        """
+        class Matcher(object):
+            score = (2,)
+            def __call__(self, request, segments):
+                if segments[0] == 'foo':
+                    return [], {}, segments[1:]
+        class Resource(resource.Resource):
+            @resource.child(Matcher())
+            def custom(self, request, segments):
+                return http.ok([('Content-Type', 'text/plain')], 'custom')
+            @resource.child('foo')
+            def foo(self, request, segments):
+                return http.ok([('Content-Type', 'text/plain')], 'foo')
+            @resource.child('bar')
+            def bar(self, request, segments):
+                return http.ok([('Content-Type', 'text/plain')], 'bar')
+            @resource.child('{name}')
+            def name(self, request, segments, name):
+                return http.ok([('Content-Type', 'text/plain')], 'name')
+        A = app.RestishApp(Resource())
+        assert webtest.TestApp(A).get('/foo').body == 'custom'
+        assert webtest.TestApp(A).get('/bar').body == 'bar'
+        assert webtest.TestApp(A).get('/baz').body == 'name'
+
     def _test_custom_match(self):
         self.fail()
 
@@ -459,6 +786,20 @@ class TestAcceptContentNegotiation(unittest.TestCase):
         response = make_app(Resource()).get('/')
         assert response.headers['Content-Type'] == 'text/html'
 
+    def test_implicit_content_type_lazy(self):
+        """
+        Test that adding the content type does not create the webob response.
+        """
+        class Resource(resource.Resource):
+            @resource.GET(accept='json')
+            def json(self, request):
+                return http.ok([], '{}')
+        response = Resource()(http.Request.blank('/'))
+        assert '_raw' in response.__dict__
+        assert response.wsgi_response() == \
+                ('200 OK', [('Content-Type', 'application/json'),
+                            ('Content-Length', '2')], ['{}'])
+
     def test_implicit_content_type_not_on_partial_mimetype(self):
         """
         Test that a match on mime type group, e.g. */*, text/*, etc does not
@@ -630,6 +971,60 @@ class TestAcceptContentNegotiation(unittest.TestCase):
         self.assertEquals(response.headers['Content-Type'], 'text/html')
         self.assertEquals(response.app_iter, ['<p>Hello!</p>'])
 
+    def test_not_acceptable_quality(self):
+        """
+        Check that a media range with a quality of 0 is not acceptable.
+        """
+        class Resource(resource.Resource):
+            @resource.GET(accept='html')
+            def html(self, request):
+                return http.ok([], '<p>Hello!</p>')
+            @resource.GET(accept='json')
+            def json(self, request):
+                return http.ok([], '"Hello!"')
+        app = make_app(Resource())
+        response = app.get('/', headers={'Accept': 'text/html;q=0, */*'})
+        assert response.headers['Content-Type'] == 'application/json'
+        app.get('/', headers={'Accept': 'text/html;q=0, application/json;q=0'},
+                status=406)
+
+    def test_default_content_type_from_list(self):
+        """
+        Check the first of many types is used when the client sends no Accept
+        header.
+        """
+        class Resource(resource.Resource):
+            @resource.GET(accept=['text/html', 'application/xhtml+xml'])
+            def html(self, request):
+                return http.ok([], '<html />')
+        response = make_app(Resource()).get('/')
+        assert response.headers['Content-Type'] == 'text/html'
+
+    def test_negotiation_cached(self):
+        """
+        Check that repeat requests reuse the previous negotiation decision.
+        """
+        class Resource(resource.Resource):
+            @resource.GET(accept='html')
+            def html(self, request):
+                return http.ok([], '<p>Hello!</p>')
+            @resource.GET(accept='json')
+            def json(self, request):
+                return http.ok([], '"Hello!"')
+        app = make_app(Resource())
+        headers = {'Accept': 'application/json'}
+        response = app.get('/', headers=headers)
+        def fail(dispatchers, request):
+            self.fail('Negotiation was not cached.')
+        best_dispatcher = resource._best_dispatcher
+        resource._best_dispatcher = fail
+        try:
+            response = app.get('/', headers=headers)
+        finally:
+            resource._best_dispatcher = best_dispatcher
+        assert response.headers['Content-Type'] == 'application/json'
+        assert response.body == '"Hello!"'
+
     def test_no_match_after_no_content_type_match(self):
         class Resource(resource.Resource):
             @resource.GET(content_type="application/json")
@@ -746,6 +1141,29 @@ class TestContentTypeContentNegotiation(unittest.TestCase):
         response = make_app(Resource()).post('/', headers={'Content-Type': ''}, status=200)
         assert response.body == 'json'
 
+    def test_malformed(self):
+        """
+        Check that a malformed content type is not matched.
+        """
+        class Resource(resource.Resource):
+            @resource.POST(content_type='json')
+            def json(self, request):
+                return http.ok([('Content-Type', 'application/json')], 'json')
+        make_app(Resource()).post('/', headers={'Content-Type': 'json'},
+                                  status=415)
+
+    def test_params(self):
+        """
+        Check that a content type with parameters still matches.
+        """
+        class Resource(resource.Resource):
+            @resource.POST(content_type='json')
+            def json(self, request):
+                return http.ok([('Content-Type', 'application/json')], 'json')
+        response = make_app(Resource()).post('/', headers={'Content-Type': 'application/json; charset=utf-8'},
+                                             status=200)
+        assert response.body == 'json'
+
     def test_content_type_and_accept(self):
         """
         Check that various combinations of content_type and accept matches are ok.
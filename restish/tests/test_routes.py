@@ -0,0 +1,113 @@
+# ~*~ coding: utf-8
+
+import unittest
+import uuid
+
+from restish import http, resource, routes, url
+
+
+POUND = '£'.decode('utf-8')
+
+
+class Users(resource.Resource):
+
+    @resource.child('{id:int}')
+    def user(self, request, segments, id):
+        pass
+
+    @resource.child('by-name/{name}')
+    def by_name(self, request, segments, name):
+        pass
+
+    @resource.child(resource.any)
+    def anything(self, request, segments):
+        pass
+
+
+class Admins(Users):
+    pass
+
+
+class Root(resource.Resource):
+
+    @resource.child()
+    def users(self, request, segments):
+        pass
+
+    @resource.child('entries/{key:uuid}')
+    def entry(self, request, segments, key):
+        pass
+
+
+class TestTemplateFormat(unittest.TestCase):
+
+    def test_format(self):
+        matcher = resource.TemplateChildMatcher('a/{b}/{c:int}')
+        self.assertEquals(matcher.format(b='x', c=1), 'a/x/1')
+
+    def test_quoting(self):
+        matcher = resource.TemplateChildMatcher(u'a b/%/{c}')
+        self.assertEquals(matcher.format(c=POUND + '/'), 'a%20b/%25/%C2%A3%2F')
+
+    def test_missing(self):
+        matcher = resource.TemplateChildMatcher('a/{b}')
+        self.assertRaises(ValueError, matcher.format)
+
+    def test_invalid(self):
+        matcher = resource.TemplateChildMatcher('users/{id:int}')
+        self.assertRaises(ValueError, matcher.format, id=u'abc')
+        self.assertRaises(ValueError, matcher.format, id=-1)
+        self.assertRaises(ValueError, matcher.format, id=u'\uff13')
+        matcher = resource.TemplateChildMatcher('entries/{key:uuid}')
+        self.assertRaises(ValueError, matcher.format, key='abc')
+
+
+class TestRoutes(unittest.TestCase):
+
+    def setUp(self):
+        self.urls = routes.Routes()
+        self.urls.mount(Root, '/')
+        self.urls.mount(Users, '/users')
+        self.urls.add('news_item', '/news/{id:int}')
+
+    def test_mounted(self):
+        self.assertEquals(self.urls.for_(Root.users), '/users')
+        self.assertEquals(self.urls.for_(Users.user, id=5), '/users/5')
+        self.assertEquals(self.urls.for_(Users.by_name, name=POUND),
+                          '/users/by-name/%C2%A3')
+        key = uuid.uuid4()
+        self.assertEquals(self.urls.for_(Root.entry, key=key),
+                          '/entries/%s' % key)
+        assert isinstance(self.urls.for_(Root.users), url.URL)
+
+    def test_named(self):
+        self.assertEquals(self.urls.for_('news_item', id=3), '/news/3')
+
+    def test_unknown(self):
+        self.assertRaises(ValueError, self.urls.for_, 'unknown')
+        self.assertRaises(ValueError, self.urls.for_, Users.anything)
+        self.assertRaises(ValueError, self.urls.for_, Admins.user, id=1)
+
+    def test_subclass(self):
+        self.urls.mount(Admins, '/admins')
+        self.assertEquals(self.urls.for_(Admins.user, id=1), '/admins/1')
+        self.assertEquals(self.urls.for_(Users.user, id=1), '/users/1')
+        # The function itself is now ambiguous.
+        func = Users.user.im_func
+        self.assertRaises(ValueError, self.urls.for_, func, id=1)
+
+    def test_function(self):
+        func = Users.user.im_func
+        self.assertEquals(self.urls.for_(func, id=1), '/users/1')
+
+    def test_bind(self):
+        request = http.Request.blank('/', base_url='/app')
+        urls = self.urls.bind(request)
+        self.assertEquals(urls.for_(Users.user, id=5), '/app/users/5')
+        self.assertEquals(urls.for_('news_item', id=3), '/app/news/3')
+        urls = self.urls.bind(http.Request.blank('/'))
+        self.assertEquals(urls.for_(Users.user, id=5), '/users/5')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import threading
+import time
+import unittest
+
+from restish import http, scheduler
+
+
+class TestScheduler(unittest.TestCase):
+
+    def test_unlimited(self):
+        s = scheduler.Scheduler()
+        for i in xrange(10):
+            s.acquire(None)
+        for i in xrange(10):
+            s.release(None)
+
+    def test_class_limit(self):
+        s = scheduler.Scheduler(limits={'bulk': 1}, timeout=0.01)
+        s.acquire('bulk')
+        self.assertRaises(http.ServiceUnavailableError, s.acquire, 'bulk')
+        # Other classes are not affected.
+        s.acquire(None)
+        s.acquire('health')
+        s.release('bulk')
+        s.acquire('bulk')
+
+    def test_max_concurrency(self):
+        s = scheduler.Scheduler(max_concurrency=2, timeout=0.01)
+        s.acquire('a')
+        s.acquire('b')
+        self.assertRaises(http.ServiceUnavailableError, s.acquire, 'c')
+        s.release('a')
+        s.acquire('c')
+
+    def test_acquire_timeout(self):
+        s = scheduler.Scheduler(limits={'bulk': 1}, timeout=0.01)
+        s.acquire('bulk')
+        # A shorter timeout, e.g. the request's deadline, gives up first.
+        self.assertRaises(http.GatewayTimeoutError, s.acquire, 'bulk', 0)
+        self.assertRaises(http.ServiceUnavailableError, s.acquire, 'bulk', 60)
+        self.assertEquals(s.waiting(), 0)
+        s = scheduler.Scheduler(limits={'bulk': 1})
+        s.acquire('bulk')
+        self.assertRaises(http.GatewayTimeoutError, s.acquire, 'bulk', 0.01)
+
+    def test_priority(self):
+        s = scheduler.Scheduler(priorities={'high': 1, 'low': -1},
+                                max_concurrency=1)
+        s.acquire(None)
+        started = []
+        def request(name):
+            s.acquire(name)
+            started.append(name)
+            s.release(name)
+        threads = []
+        for name in ['low', None, 'high']:
+            thread = threading.Thread(target=request, args=(name,))
+            thread.start()
+            threads.append(thread)
+            # Wait for the thread to queue.
+            while s.waiting() < len(threads):
+                time.sleep(0.001)
+        s.release(None)
+        for thread in threads:
+            thread.join()
+        self.assertEquals(started, ['high', None, 'low'])
+
+    def test_blocked_class_does_not_block_others(self):
+        s = scheduler.Scheduler(limits={'bulk': 1}, priorities={'bulk': 1},
+                                timeout=1)
+        s.acquire('bulk')
+        thread = threading.Thread(target=s.acquire, args=('bulk',))
+        thread.start()
+        while not s.waiting():
+            time.sleep(0.001)
+        # The waiting, higher priority, bulk request cannot start so does not
+        # hold up this one.
+        s.acquire(None)
+        s.release('bulk')
+        thread.join()
+        self.assertEquals((s.running('bulk'), s.running(None), s.running()),
+                          (1, 1, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
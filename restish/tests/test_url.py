@@ -70,6 +70,13 @@ class TestUtils(unittest.TestCase):
         self.assertEquals(url.split_path('/%2F'), ['/'])
         self.assertEquals(url.split_path('/%C2%A3'), [POUND])
 
+    def test_split_path_cached(self):
+        segments = url.split_path('/foo/bar')
+        segments.append('baz')
+        self.assertEquals(url.split_path('/foo/bar'), ['foo', 'bar'])
+        self.assertRaises(UnicodeDecodeError, url.split_path, '/%E0')
+        self.assertRaises(UnicodeDecodeError, url.split_path, '/%E0')
+
     def test_join_path(self):
         self.assertEquals(url.join_path([]), '')
         self.assertEquals(url.join_path(['']), '/')
@@ -88,6 +95,11 @@ class TestUtils(unittest.TestCase):
         self.assertEquals(url.split_query('a=1=2'), [('a', '1=2')])
         self.assertEquals(url.split_query('a=%3F'), [('a', '?')])
         self.assertEquals(url.split_query('%C2%A3=%C2%A3'), [(POUND, POUND)])
+        self.assertEquals(url.split_query('a=b+c&d+e'), [('a', 'b c'),
+                                                          ('d e', None)])
+        self.assertEquals(url.split_query('a=1&&b'), [('a', '1'), ('b', None)])
+        for name, value in url.split_query('a=1&%C2%A3=b'):
+            assert isinstance(name, unicode) and isinstance(value, unicode)
 
     def test_join_query(self):
         self.assertEquals(url.join_query([]), '')
@@ -100,6 +112,35 @@ class TestUtils(unittest.TestCase):
         self.assertEquals(url.join_query([(POUND, POUND)]), '%C2%A3=%C2%A3')
 
 
+class TestQueryDict(unittest.TestCase):
+
+    def test_mapping(self):
+        d = url.QueryDict([('a', '1'), ('b', None), ('a', '2')])
+        self.assertEquals(d['a'], '2')
+        self.assertEquals(d['b'], None)
+        self.assertRaises(KeyError, d.__getitem__, 'c')
+        self.assertEquals(d.get('a'), '2')
+        self.assertEquals(d.get('c', 'default'), 'default')
+        self.assertEquals(d.getall('a'), ['1', '2'])
+        self.assertEquals(d.getall('c'), [])
+        assert 'a' in d and 'c' not in d
+        self.assertEquals(len(d), 3)
+
+    def test_order(self):
+        d = url.QueryDict([('a', '1'), ('b', None), ('a', '2')])
+        self.assertEquals(list(d), ['a', 'b', 'a'])
+        self.assertEquals(d.keys(), ['a', 'b', 'a'])
+        self.assertEquals(d.values(), ['1', None, '2'])
+        self.assertEquals(d.items(), [('a', '1'), ('b', None), ('a', '2')])
+        self.assertEquals(d.mixed(), {'a': ['1', '2'], 'b': None})
+
+    def test_equality(self):
+        self.assertEquals(url.QueryDict([('a', '1')]),
+                          url.QueryDict([('a', '1')]))
+        self.assertNotEquals(url.QueryDict([('a', '1')]),
+                             url.QueryDict([('a', '2')]))
+
+
 class TestURL(unittest.TestCase):
 
     def test_properties(self):
@@ -112,6 +153,24 @@ class TestURL(unittest.TestCase):
         self.assertEquals(u.query_list, [('d', None), ('e', 'f')])
         self.assertEquals(u.fragment, 'g')
 
+    def test_query_dict(self):
+        u = url.URL("http://localhost/?a=1&b&a=%C2%A3")
+        self.assertEquals(u.query_dict.getall('a'), ['1', POUND])
+        assert u.query_dict is u.query_dict
+
+    def test_lazy_parsing(self):
+        u = url.URL("http://localhost:1234/a/b/c?d&e=f#g")
+        assert 'parsed_url' not in u.__dict__
+        self.assertEquals(u.scheme, 'http')
+        assert 'parsed_url' in u.__dict__
+
+    def test_cached_lists(self):
+        u = url.URL("http://localhost:1234/a/b/c?d&e=f#g")
+        u.path_segments.append('d')
+        u.query_list.append(('g', 'h'))
+        self.assertEquals(u.path_segments, ['a', 'b', 'c'])
+        self.assertEquals(u.query_list, [('d', None), ('e', 'f')])
+
     def test_roundtrip(self):
         tests = (
             "http://localhost",
@@ -515,5 +574,69 @@ class TestURLAccessor(unittest.TestCase):
         assert u == 'http://localhost:1234/a/b/c'
         self.assertTrue(isinstance(u, url.URL))
 
+
+class TestURLBuilder(unittest.TestCase):
+
+    URLS = ["http://localhost", "http://localhost/", "http://localhost/a/b/",
+            "http://localhost:1234/a/b/c?d&e=f#g", "/a/b?c=d", ""]
+
+    def check(self, build):
+        # Check the builder gives the same URL as the equivalent URL methods.
+        for u in self.URLS:
+            u = url.URL(u)
+            try:
+                expected = build(u)
+            except IndexError:
+                self.assertRaises(IndexError, build, u.builder())
+            else:
+                self.assertEquals(build(u.builder()).url(), expected)
+
+    def test_url(self):
+        for u in self.URLS:
+            b = url.URL(u).builder()
+            assert isinstance(b.url(), url.URL)
+            self.assertEquals(b.url(), url.URL(u))
+            self.assertEquals(str(url.URLBuilder(u)), u)
+
+    def test_path(self):
+        self.check(lambda u: u.root())
+        self.check(lambda u: u.child('x', 'y'))
+        self.check(lambda u: u.child(POUND).child('/'))
+        self.check(lambda u: u.sibling('x'))
+        self.check(lambda u: u.child('x').parent().parent())
+
+    def test_query(self):
+        self.check(lambda u: u.add_query('x').add_query('y', 'z'))
+        self.check(lambda u: u.add_queries([('x', 1), ('y', POUND)]))
+        self.check(lambda u: u.q('e', 2).q('x', 3))
+        self.check(lambda u: u.rmq('e').remove_query('d'))
+        self.check(lambda u: u.clear_queries())
+        self.check(lambda u: u.clear_queries('e'))
+
+    def test_other(self):
+        self.check(lambda u: u.secure())
+        self.check(lambda u: u.secure(False, 8080))
+        self.check(lambda u: u.anchor('x'))
+        self.check(lambda u: u.anchor())
+
+    def test_chain(self):
+        self.check(lambda u: u.child('a').child('b').q('page', 2).anchor('x'))
+        self.check(lambda u: u.q('page', 2).child('a'))
+
+    def test_children(self):
+        for u in self.URLS:
+            u = url.URL(u)
+            b = u.builder()
+            self.assertEquals(b.children(['x', POUND, '/']),
+                              [u.child('x'), u.child(POUND), u.child('/')])
+            self.assertEquals(b.url(), u)
+
+    def test_copy(self):
+        b = url.URL('http://localhost/a?b=c').builder()
+        c = b.copy().child('d').q('b', 'e')
+        self.assertEquals(b.url(), 'http://localhost/a?b=c')
+        self.assertEquals(c.url(), 'http://localhost/a/d?b=e')
+
+
 if __name__ == '__main__':
     unittest.main()
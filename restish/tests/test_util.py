@@ -1,3 +1,4 @@
+import time
 import unittest
 import webtest
 
@@ -22,6 +23,12 @@ class TestWSGI(unittest.TestCase):
         assert response.headers['Content-Type'] == 'text/plain'
         assert response.body == 'SCRIPT_NAME: /foo, PATH_INFO: /bar'
 
+    def test_deadline(self):
+        request = http.Request.blank('/foo')
+        request.deadline = time.time() - 1
+        self.assertRaises(http.GatewayTimeoutError, util.wsgi, request,
+                          wsgi_app, [u'foo'])
+
     def test_root_wsgi_resource(self):
         """
         Test a WSGIResource that is the root resource.
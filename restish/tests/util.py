@@ -11,3 +11,18 @@ def wsgi_out(app, environ):
     if hasattr(result, 'close'):
         result.close()
     return out
+
+
+class Clock(object):
+    """
+    Stand-in for the time module, with a clock that only moves when told to.
+    """
+
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
@@ -1,6 +1,8 @@
 import urlparse
 import urllib
 
+from restish import cache
+
 
 # Lists of characters considered "safe", i.e. should not be escape encoded.
 SAFE = '-_.!*\'()~'
@@ -35,14 +37,25 @@ def _unquote(S):
     return urllib.unquote_plus(S)
 
 
+# Cache of recently split paths, see split_path.
+_split_path_cache = cache.LRUCache(1024)
+
+
 def split_path(path):
     """
     Split a path of type str into a sequence of unicode segments.
+
+    Recently split paths are cached so the segments of a popular path are
+    only unquoted and decoded once.
     """
-    segments = [urllib.unquote(segment) for segment in path.split('/')]
-    if segments[:1] == ['']:
-        segments = segments[1:]
-    return [_decode(S) for S in segments]
+    segments = _split_path_cache.get(path)
+    if segments is None:
+        segments = [urllib.unquote(segment) for segment in path.split('/')]
+        if segments[:1] == ['']:
+            segments = segments[1:]
+        segments = tuple([_decode(S) for S in segments])
+        _split_path_cache.set(path, segments)
+    return list(segments)
 
 
 def join_path(path_segments):
@@ -55,15 +68,21 @@ def join_path(path_segments):
         for seg in path_segments])
 
 
-def _split_query(query):
+def quote_segment(segment):
     """
-    Break the query into tuples of it's unquotes elements
+    Quote a single path segment (str or unicode) for use in a URL path.
     """
-    for x in query.split('&'):
-        if '=' in x:
-            yield tuple(_decode(_unquote(s)) for s in x.split('=', 1))
-        elif x:
-            yield (_decode(_unquote(x)), None)
+    return _quote(_encode(segment), SAFE_SEGMENT)
+
+
+def _decode_query(S):
+    """
+    Unquote and decode a query name or value, skipping the unquoting when
+    there is nothing to unquote.
+    """
+    if '%' in S or '+' in S:
+        S = _unquote(S)
+    return _decode(S)
 
 
 def split_query(query):
@@ -71,22 +90,124 @@ def split_query(query):
     Split a query string (str) into a sequence of (name, value) tuples where
     name and value are unicode instances.
     """
-    return list(_split_query(query))
+    query_list = []
+    for x in query.split('&'):
+        if not x:
+            continue
+        name, sep, value = x.partition('=')
+        if sep:
+            query_list.append((_decode_query(name), _decode_query(value)))
+        else:
+            query_list.append((_decode_query(name), None))
+    return query_list
 
 
 def join_query(query_list):
     """
     Join a sequence of (name, value) tuples into a single str.
     """
-    def one(KV):
-        (K, V) = KV
+    parts = []
+    for (K, V) in query_list:
+        K = _quote(_encode(K), SAFE_QUERY_NAME)
         if V is None:
-            return _quote(_encode(K), SAFE_QUERY_NAME)
+            parts.append(K)
         else:
-            V = unicode(V)
-            return '%s=%s' % (_quote(_encode(K), SAFE_QUERY_NAME), \
-                              _quote(_encode(V), SAFE_QUERY_VALUE))
-    return '&'.join(one(KV) for KV in query_list)
+            parts.append('%s=%s' % (K, _quote(_encode(unicode(V)),
+                                              SAFE_QUERY_VALUE)))
+    return '&'.join(parts)
+
+
+class QueryDict(object):
+    """
+    Read-only, ordered multi-dict view of a sequence of (name, value) query
+    tuples.
+
+    Like webob's MultiDict, d[name] and d.get(name) return the last value for
+    name; d.getall(name) returns all of them. Iterating, keys(), values() and
+    items() include every tuple, in order.
+    """
+
+    def __init__(self, query_list):
+        self._items = tuple(query_list)
+        self._values = values = {}
+        for name, value in self._items:
+            values.setdefault(name, []).append(value)
+
+    def __getitem__(self, name):
+        return self._values[name][-1]
+
+    def __contains__(self, name):
+        return name in self._values
+
+    def __iter__(self):
+        return (name for name, value in self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __eq__(self, other):
+        if isinstance(other, QueryDict):
+            return self._items == other._items
+        return NotImplemented
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __repr__(self):
+        return 'QueryDict(%r)' % (list(self._items),)
+
+    def get(self, name, default=None):
+        """
+        Return the last value for name, or default if there is none.
+        """
+        values = self._values.get(name)
+        if values is None:
+            return default
+        return values[-1]
+
+    def getall(self, name):
+        """
+        Return the list of values for name.
+        """
+        return list(self._values.get(name, ()))
+
+    def keys(self):
+        return [name for name, value in self._items]
+
+    def values(self):
+        return [value for name, value in self._items]
+
+    def items(self):
+        return list(self._items)
+
+    def mixed(self):
+        """
+        Return a dict of name to value, or to the list of values for names
+        that have more than one value.
+        """
+        return dict((name, values[0] if len(values) == 1 else list(values))
+                    for name, values in self._values.iteritems())
+
+
+class _cached_property(object):
+    """
+    Property-like decorator that calls the decorated method on first access
+    only, storing the result in the instance's __dict__ in place of the
+    descriptor.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        value = obj.__dict__[self.func.__name__] = self.func(obj)
+        return value
 
 
 class URL(str):
@@ -103,14 +224,17 @@ class URL(str):
     The URL class tries to be unicode-aware. Unicode path segments and query
     components are UTF-8 encoded on the way in and always returned as unicode
     instances. Note however that the URL itself is a byte string.
+
+    A URL is only parsed when one of its parts is first needed, and the
+    parsed URL, path segments and query list are then remembered.
     """
 
-    def __init__(self, url):
-        """
-        Create a new URL instance from a str URL.
-        """
-        str.__init__(url)
-        self.parsed_url = urlparse.urlsplit(url)
+    @_cached_property
+    def parsed_url(self):
+        """ The urlparse.SplitResult of the url """
+        # Parse a plain str: urlsplit's cache would compare URL instances
+        # using __eq__, which needs the parsed URL.
+        return urlparse.urlsplit(str.__str__(self))
 
     def __eq__(self, other):
         if isinstance(other, URL):
@@ -142,7 +266,11 @@ class URL(str):
     @property
     def path_segments(self):
         """ A list of url segments """
-        return split_path(self.path)
+        return list(self._path_segments)
+
+    @_cached_property
+    def _path_segments(self):
+        return tuple(split_path(self.parsed_url[2]))
 
     @property
     def query(self):
@@ -152,7 +280,16 @@ class URL(str):
     @property
     def query_list(self):
         """ The query parameters as a list of tuples """
-        return split_query(self.query)
+        return list(self._query_list)
+
+    @_cached_property
+    def _query_list(self):
+        return tuple(split_query(self.parsed_url[3]))
+
+    @_cached_property
+    def query_dict(self):
+        """ The query parameters as a QueryDict """
+        return QueryDict(self._query_list)
 
     @property
     def fragment(self):
@@ -364,6 +501,234 @@ class URL(str):
         """
         return self.clone(fragment=anchor)
 
+    ## building ##
+
+    def builder(self):
+        """
+        Return a URLBuilder to make several changes to the URL at once.
+        """
+        return URLBuilder(self)
+
+
+class URLBuilder(object):
+    """
+    Mutable URL, used to make several changes to a URL without building (and
+    parsing) a new URL after each one.
+
+    The URLBuilder has the same URL manipulation methods as URL but each
+    changes the builder and returns it so that calls can be chained. The path
+    and query are only split into segments and (name, value) tuples if they
+    are changed. Call url() to build the URL, e.g.
+
+        URL('http://localhost/a').builder().child('b').q('page', 2).url()
+    """
+
+    def __init__(self, url):
+        if isinstance(url, URL):
+            parsed_url = url.parsed_url
+        else:
+            parsed_url = urlparse.urlsplit(url)
+        self.scheme, self.netloc, self._path, self._query, self.fragment = \
+                parsed_url
+        self._path_segments = None
+        self._query_list = None
+
+    def url(self):
+        """
+        Build the URL.
+        """
+        return URL(urlparse.urlunsplit((self.scheme, self.netloc, self.path,
+                                        self.query, self.fragment)))
+
+    def __str__(self):
+        return self.url()
+
+    def __repr__(self):
+        return '<URLBuilder %r>' % (self.url(),)
+
+    def copy(self):
+        """
+        Return a copy of the builder.
+        """
+        other = self.__class__.__new__(self.__class__)
+        other.__dict__.update(self.__dict__)
+        if self._path_segments is not None:
+            other._path_segments = list(self._path_segments)
+        if self._query_list is not None:
+            other._query_list = list(self._query_list)
+        return other
+
+    @property
+    def path(self):
+        """ The path of the url """
+        if self._path_segments is not None:
+            self._path = join_path(self._path_segments)
+            self._path_segments = None
+        return self._path
+
+    @property
+    def path_segments(self):
+        """ The list of path segments, changes are applied to the builder """
+        if self._path_segments is None:
+            self._path_segments = split_path(self._path)
+        return self._path_segments
+
+    @property
+    def query(self):
+        """ The query string """
+        if self._query_list is not None:
+            self._query = join_query(self._query_list)
+            self._query_list = None
+        return self._query
+
+    @property
+    def query_list(self):
+        """ The list of query tuples, changes are applied to the builder """
+        if self._query_list is None:
+            self._query_list = split_query(self._query)
+        return self._query_list
+
+    def _set_path(self, path_segments):
+        # Like URL's path manipulations, also remove the query and fragment.
+        self._path_segments = path_segments
+        self._query, self._query_list = '', None
+        self.fragment = ''
+        return self
+
+    ## path manipulations ##
+
+    def root(self):
+        """
+        Change the URL to the root of the web server.
+        """
+        return self._set_path([''])
+
+    def sibling(self, segment):
+        """
+        Replace the last path segment with the given segment.
+        """
+        l = self.path_segments
+        l[-1] = segment
+        return self._set_path(l)
+
+    def child(self, *path):
+        """
+        Add the given path segments to the path.
+        """
+        l = self.path_segments
+        if l[-1:] == ['']:
+            l[-1:] = path
+        else:
+            l.extend(path)
+        return self._set_path(l)
+
+    def parent(self):
+        """
+        Remove the last path segment.
+        """
+        l = self.path_segments
+        l.pop()
+        return self._set_path(l)
+
+    def children(self, segments):
+        """
+        Return a list of URLs, one for each of the segments as a child of the
+        builder's URL (see child). The builder is not changed.
+        """
+        l = self.path_segments
+        if l[-1:] == ['']:
+            l = l[:-1]
+        head = urlparse.urlunsplit((self.scheme, self.netloc, join_path(l),
+                                    '', '')) + '/'
+        return [URL(head + _quote(_encode(segment), SAFE_SEGMENT))
+                for segment in segments]
+
+    ## query manipulations ##
+
+    def add_query(self, name, value=None):
+        """
+        Add a query argument with the given value.
+        """
+        self.query_list.append((name, value))
+        return self
+
+    def add_queries(self, query_list):
+        """
+        Add multiple query args from a list of tuples.
+        """
+        self.query_list.extend(query_list)
+        return self
+
+    def replace_query(self, name, value=None):
+        """
+        Remove all existing occurrences of the query argument 'name', *if it
+        exists*, then add the argument with the given value.
+        """
+        if value is not None:
+            value = unicode(value)
+        ql = self.query_list
+        ## Preserve the original position of the query key in the list
+        i = 0
+        for (k, v) in ql:
+            if k == name:
+                break
+            i += 1
+        ql[:] = [x for x in ql if x[0] != name]
+        ql.insert(i, (name, value))
+        return self
+
+    def remove_query(self, name):
+        """
+        Remove all query arguments with the given name.
+        """
+        ql = self.query_list
+        ql[:] = [x for x in ql if x[0] != name]
+        return self
+
+    def clear_queries(self, name=None):
+        """
+        Remove all existing query arguments, or only those with the given
+        name.
+        """
+        if name is None:
+            self._query, self._query_list = '', None
+            return self
+        return self.remove_query(name)
+
+    def q(self, name, value=None):
+        """Convenience alias for replace_query."""
+        return self.replace_query(name, value)
+
+    def rmq(self, name):
+        """Convenience alias for remove_query."""
+        return self.remove_query(name)
+
+    ## scheme manipulation ##
+
+    def secure(self, secure=True, port=None):
+        """
+        Change the scheme to https/http, see URL.secure.
+        """
+        if secure:
+            scheme, defaultPort = 'https', 443
+        else:
+            scheme, defaultPort = 'http', 80
+        netloc = self.netloc.split(':', 1)[0]
+        if port is not None and port != defaultPort:
+            netloc = '%s:%d' % (netloc, port)
+        self.scheme, self.netloc = scheme, netloc
+        return self
+
+    ## fragment/anchor manipulation
+
+    def anchor(self, anchor=None):
+        """
+        Change the fragment/anchor. An anchor of None (the default) or ''
+        removes the current anchor.
+        """
+        self.fragment = anchor or ''
+        return self
+
 
 class URLAccessor(object):
     """
@@ -29,8 +29,11 @@ def wsgi(request, app, path_info_segments):
     the start_response exc_info arg, nor does it handle calls to the write
     function that must be returned from start_response.
     """
+    # Don't start work that is too late to be useful.
+    request.check_deadline()
     # Copy and update the environ to set new SCRIPT_NAME and PATH_INFO.
-    script_segments = request.path.path_segments
+    script_segments = url.split_path(request.environ.get('SCRIPT_NAME', '')) \
+            + request.path_info_segments
     if path_info_segments:
         script_segments = script_segments[:-len(path_info_segments)]
     environ = dict(request.environ)
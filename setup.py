@@ -43,7 +43,6 @@ setup(
 
     install_requires=[
         # -*- Extra requirements: -*-
-        'mimeparse>=0.1.3',
         'WebOb',
     ],
 